@@ -1,8 +1,8 @@
 import { useState } from 'react';
-import { callCipher } from './api';
+import { callCipher, fetchTracePage } from './api';
 import { bytesToHex, hexToBytes } from './utils';
-import type { AesMode, Encoding, Operation } from './types/crypto-ui';
-import type { CipherResponse } from './types/api';
+import type { AesMode, CounterWidth, Encoding, Operation, TraceLevel } from './types/crypto-ui';
+import type { CipherResponse, TracePage } from './types/api';
 import { infoSections } from './content/info';
 import './App.css';
 
@@ -14,11 +14,22 @@ type FormState = {
   keyHex: string;
   ivHex: string;
   counterHex: string;
+  counterWidth: CounterWidth;
+  aadHex: string;
+  sector: number;
+  trace: TraceLevel;
 };
 
-const modes: AesMode[] = ['ECB', 'CBC', 'CFB', 'OFB', 'CTR'];
+const modes: AesMode[] = ['ECB', 'CBC', 'CFB', 'OFB', 'CTR', 'GCM', 'CCM', 'XTS'];
 const encodings: Encoding[] = ['utf8', 'hex', 'base64'];
+const traceLevels: TraceLevel[] = ['full', 'summary', 'stored', 'none'];
+const counterWidths: CounterWidth[] = [128, 64, 32];
+const TRACE_PAGE_SIZE = 50;
 const BLOCK_BYTES = 16;
+const NONCE_BYTES = 12;
+const CCM_NONCE_BYTES = [7, 8, 9, 10, 11, 12, 13];
+const TAG_BYTES = 16;
+const UTF8_PREVIEW_BYTES = 4096;
 
 const initialForm: FormState = {
   operation: 'encrypt',
@@ -28,16 +39,20 @@ const initialForm: FormState = {
   keyHex: '000102030405060708090a0b0c0d0e0f',
   ivHex: '',
   counterHex: '',
+  counterWidth: 128,
+  aadHex: '',
+  sector: 0,
+  trace: 'full',
 };
 
-const badKey = (hex: string) => {
+const badKey = (hex: string, sizes = [16, 24, 32]) => {
   const key = hexToBytes(hex);
-  return ![16, 24, 32].includes(key.length);
+  return !sizes.includes(key.length);
 };
 
-const badBlock = (hex: string) => {
+const badBlock = (hex: string, size = BLOCK_BYTES) => {
   if (!hex.trim()) return false;
-  return hexToBytes(hex).length !== BLOCK_BYTES;
+  return hexToBytes(hex).length !== size;
 };
 
 function App() {
@@ -47,12 +62,16 @@ function App() {
   const [notice, setNotice] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [fieldErrors, setFieldErrors] = useState<Record<string, string>>({});
+  const [tracePage, setTracePage] = useState<TracePage | null>(null);
 
-  const needsIv = form.mode !== 'ECB' && form.mode !== 'CTR';
+  const sectored = form.mode === 'XTS';
+  const needsIv = form.mode !== 'ECB' && form.mode !== 'CTR' && !sectored;
   const needsCounter = form.mode === 'CTR';
+  const authenticated = form.mode === 'GCM' || form.mode === 'CCM';
+  const ivBytes = authenticated ? NONCE_BYTES : BLOCK_BYTES;
 
   const placeholders = {
-    iv: 'Defaults to 16-byte zeros if empty',
+    iv: `Defaults to ${ivBytes}-byte zeros if empty`,
     counter: 'Defaults to 16-byte zeros if empty',
     text:
       form.operation === 'encrypt'
@@ -62,7 +81,7 @@ function App() {
         : 'Enter ciphertext in selected encoding...',
   };
 
-  const setField = (key: keyof FormState, value: string | boolean) => {
+  const setField = (key: keyof FormState, value: string | number | boolean) => {
     setForm((prev) => ({ ...prev, [key]: value }));
     setFieldErrors((prev) => {
       const copy = { ...prev };
@@ -73,8 +92,13 @@ function App() {
 
   const checkInputs = () => {
     const errs: Record<string, string> = {};
-    if (badKey(form.keyHex)) errs.key = 'Key must be 16/24/32 bytes hex';
-    if (needsIv && badBlock(form.ivHex)) errs.iv = 'IV must be 16 bytes hex';
+    if (sectored) {
+      if (badKey(form.keyHex, [32, 64])) errs.key = 'XTS key must be 32/64 bytes hex (data key, then tweak key)';
+    } else if (badKey(form.keyHex)) errs.key = 'Key must be 16/24/32 bytes hex';
+    if (sectored && !(Number.isInteger(form.sector) && form.sector >= 0)) errs.sector = 'Sector must be a whole number';
+    if (form.mode === 'CCM') {
+      if (form.ivHex.trim() && !CCM_NONCE_BYTES.includes(hexToBytes(form.ivHex).length)) errs.iv = 'CCM nonce must be 7-13 bytes hex';
+    } else if (needsIv && badBlock(form.ivHex, ivBytes)) errs.iv = authenticated ? 'Nonce must be 12 bytes hex' : 'IV must be 16 bytes hex';
     if (needsCounter && badBlock(form.counterHex)) errs.counter = 'Counter must be 16 bytes hex';
     setFieldErrors(errs);
     return Object.keys(errs).length === 0;
@@ -84,17 +108,21 @@ function App() {
     setError(null);
     setNotice(null);
     setResult(null);
+    setTracePage(null);
     if (!checkInputs()) {
       setError('Please fix the highlighted fields.');
       return;
     }
     setLoading(true);
     try {
-      const response = await callCipher({ ...form, padding: true });
+      const response = await callCipher({ ...form, padding: true, utf8PreviewLimit: UTF8_PREVIEW_BYTES });
       setResult(response);
       if (response.autoPadded) {
         setNotice('Padding was auto-applied for this mode.');
       }
+      if (response.trace?.id) {
+        setTracePage(await fetchTracePage(response.trace.id, 0, TRACE_PAGE_SIZE));
+      }
     } catch (e: unknown) {
       const msg = e instanceof Error ? e.message : 'Unexpected error';
       setError(msg);
@@ -103,12 +131,23 @@ function App() {
     }
   };
 
-  const fillRandom = (key: 'ivHex' | 'counterHex') => {
-    const bytes = new Uint8Array(BLOCK_BYTES);
+  const loadTracePage = async (offset: number) => {
+    if (!result?.trace?.id) return;
+    try {
+      setTracePage(await fetchTracePage(result.trace.id, offset, TRACE_PAGE_SIZE));
+    } catch (e: unknown) {
+      setError(e instanceof Error ? e.message : 'Unexpected error');
+    }
+  };
+
+  const shownSteps = tracePage ? tracePage.steps : result?.steps ?? [];
+
+  const fillRandom = (key: 'ivHex' | 'counterHex', size = BLOCK_BYTES) => {
+    const bytes = new Uint8Array(size);
     if (typeof crypto !== 'undefined' && crypto.getRandomValues) {
       crypto.getRandomValues(bytes);
     } else {
-      for (let i = 0; i < BLOCK_BYTES; i += 1) bytes[i] = Math.floor(Math.random() * 256);
+      for (let i = 0; i < size; i += 1) bytes[i] = Math.floor(Math.random() * 256);
     }
     setField(key, bytesToHex(bytes));
   };
@@ -120,7 +159,7 @@ function App() {
           <span className="brand-mark">AES</span>
           <div className="brand-text">
             <div className="brand-title">Modes Playground</div>
-            <div className="brand-subtitle">Python backend · ECB / CBC / CFB / OFB / CTR</div>
+            <div className="brand-subtitle">Python backend · ECB / CBC / CFB / OFB / CTR / GCM / CCM / XTS</div>
           </div>
         </div>
         <p className="tagline">Simple React UI calling a Flask API. Enter key/data, pick a mode, see output and steps.</p>
@@ -167,9 +206,20 @@ function App() {
               </select>
             </div>
 
+            <div className="control-row">
+              <label className="label">Step trace</label>
+              <select value={form.trace} onChange={(e) => setField('trace', e.target.value)}>
+                {traceLevels.map((level) => (
+                  <option key={level} value={level}>
+                    {level}
+                  </option>
+                ))}
+              </select>
+            </div>
+
             <div className="control-row">
               <label className="label" htmlFor="key">
-                Key (hex, 16/24/32 bytes)
+                {sectored ? 'Key (hex, 32/64 bytes: data key + tweak key)' : 'Key (hex, 16/24/32 bytes)'}
               </label>
               <input
                 id="key"
@@ -185,7 +235,7 @@ function App() {
             {needsIv && (
               <div className="control-row">
                 <label className="label" htmlFor="iv">
-                  IV (hex, 16 bytes)
+                  {authenticated ? `Nonce (hex, ${form.mode === 'CCM' ? '7-13' : '12'} bytes)` : 'IV (hex, 16 bytes)'}
                 </label>
                 <input
                   id="iv"
@@ -197,8 +247,8 @@ function App() {
                 />
                 {fieldErrors.iv && <div className="field-error">{fieldErrors.iv}</div>}
                 <div className="inline-actions">
-                  <button type="button" className="small" onClick={() => fillRandom('ivHex')}>
-                    Random IV
+                  <button type="button" className="small" onClick={() => fillRandom('ivHex', ivBytes)}>
+                    {authenticated ? 'Random nonce' : 'Random IV'}
                   </button>
                   <button type="button" className="small ghost" onClick={() => setField('ivHex', '')}>
                     Use zeros
@@ -231,6 +281,51 @@ function App() {
                 </div>
               </div>
             )}
+
+            {authenticated && (
+              <div className="control-row">
+                <label className="label" htmlFor="aad">
+                  Associated data (hex, optional)
+                </label>
+                <input
+                  id="aad"
+                  value={form.aadHex}
+                  onChange={(e) => setField('aadHex', e.target.value)}
+                  spellCheck={false}
+                  placeholder="Authenticated but not encrypted"
+                />
+              </div>
+            )}
+
+            {sectored && (
+              <div className="control-row">
+                <label className="label" htmlFor="sector">
+                  First sector number (512-byte sectors)
+                </label>
+                <input
+                  id="sector"
+                  type="number"
+                  min={0}
+                  className={fieldErrors.sector ? 'error' : ''}
+                  value={form.sector}
+                  onChange={(e) => setField('sector', Number(e.target.value))}
+                />
+                {fieldErrors.sector && <div className="field-error">{fieldErrors.sector}</div>}
+              </div>
+            )}
+
+            {needsCounter && (
+              <div className="control-row">
+                <label className="label">Counter field (bits)</label>
+                <select value={form.counterWidth} onChange={(e) => setField('counterWidth', Number(e.target.value))}>
+                  {counterWidths.map((width) => (
+                    <option key={width} value={width}>
+                      {width === 128 ? '128 (whole block)' : `${width} (nonce + counter)`}
+                    </option>
+                  ))}
+                </select>
+              </div>
+            )}
           </div>
         </section>
 
@@ -270,18 +365,50 @@ function App() {
                 <div className="output-label">UTF-8</div>
                 <code className="output-value">{result.output.utf8}</code>
               </div>
-              {result.ivUsed && <div className="hint">Used IV: {result.ivUsed}</div>}
+              {result.output.utf8Truncated && (
+                <div className="hint">UTF-8 preview shows the first {UTF8_PREVIEW_BYTES} bytes only</div>
+              )}
+              {authenticated && form.operation === 'encrypt' && (
+                <div className="hint">The last {TAG_BYTES} bytes are the authentication tag; decrypt needs them too.</div>
+              )}
+              {result.ivUsed && <div className="hint">Used {authenticated ? 'nonce' : 'IV'}: {result.ivUsed}</div>}
               {result.counterUsed && <div className="hint">Used counter: {result.counterUsed}</div>}
             </div>
           )}
         </section>
       </main>
 
-      {result && result.steps.length > 0 && (
+      {result && shownSteps.length > 0 && (
         <section className="card">
           <h2>Step-by-step ({form.mode})</h2>
+          {result.trace && result.trace.level === 'summary' && (
+            <div className="hint">Showing first and last blocks of {result.trace.blocks}.</div>
+          )}
+          {tracePage && (
+            <div className="inline-actions">
+              <button
+                type="button"
+                className="small"
+                disabled={tracePage.offset === 0}
+                onClick={() => loadTracePage(Math.max(0, tracePage.offset - TRACE_PAGE_SIZE))}
+              >
+                Previous
+              </button>
+              <span className="hint">
+                Steps {tracePage.offset + 1}-{tracePage.offset + tracePage.steps.length} of {tracePage.total}
+              </span>
+              <button
+                type="button"
+                className="small"
+                disabled={tracePage.offset + TRACE_PAGE_SIZE >= tracePage.total}
+                onClick={() => loadTracePage(tracePage.offset + TRACE_PAGE_SIZE)}
+              >
+                Next
+              </button>
+            </div>
+          )}
           <div className="steps">
-            {result.steps.map((step) => (
+            {shownSteps.map((step) => (
               <div key={step.title} className="step-block">
                 <div className="step-title">{step.title}</div>
                 <div className="step-fields">
@@ -1,4 +1,4 @@
-import type { CipherRequest, CipherResponse } from './types/api';
+import type { CipherRequest, CipherResponse, TracePage } from './types/api';
 
 const API_BASE = '/api';
 
@@ -16,3 +16,14 @@ export const callCipher = async (payload: CipherRequest): Promise<CipherResponse
 
   return (await res.json()) as CipherResponse;
 };
+
+export const fetchTracePage = async (id: string, offset: number, limit: number): Promise<TracePage> => {
+  const res = await fetch(`${API_BASE}/trace/${encodeURIComponent(id)}?offset=${offset}&limit=${limit}`);
+
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(text || `Request failed with status ${res.status}`);
+  }
+
+  return (await res.json()) as TracePage;
+};
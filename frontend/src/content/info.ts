@@ -11,6 +11,9 @@ export const infoSections: InfoSection[] = [
       'IV (CBC/CFB/OFB) or Counter (CTR) defaults to zeros; use the random buttons for fresh values and reuse them for decryption.',
       'Select input encoding that matches what you paste. Decrypt auto-detects hex/base64 when encoding is left on UTF-8.',
       'ECB/CBC auto-apply padding if needed; stream modes ignore padding.',
+      'GCM takes a 12-byte nonce and optional associated data. Encrypt appends a 16-byte tag; decrypt expects it at the end and fails if anything was changed.',
+      'CCM works the same way with a 7-13 byte nonce (12 by default); shorter nonces allow longer messages.',
+      'XTS takes a double-length key (data key, then tweak key) and a first sector number; each 512-byte sector is encrypted on its own, and a short last block uses ciphertext stealing instead of padding.',
     ],
   },
   {
@@ -32,6 +35,9 @@ export const infoSections: InfoSection[] = [
     title: 'Known Vectors',
     body: [
       'NIST SP 800-38A vectors are built-in for ECB/CBC/CFB/OFB/CTR.',
+      'GCM matches the NIST SP 800-38D (GCM spec) test cases for 128/192/256-bit keys.',
+      'CCM matches the NIST SP 800-38C examples and the RFC 3610 packet vectors.',
+      'XTS matches the IEEE 1619 vectors, including the ciphertext-stealing ones.',
       'Web Crypto cross-check is used for CTR. CBC cross-check uses NIST because Web Crypto pads differently by default.',
     ],
   },
@@ -1,4 +1,4 @@
-import type { Encoding } from './crypto-ui';
+import type { AesMode, CounterWidth, Encoding, OutputEncoding, TraceLevel } from './crypto-ui';
 
 export interface StepField {
   label: string;
@@ -12,24 +12,53 @@ export interface Step {
 
 export interface CipherRequest {
   operation: 'encrypt' | 'decrypt';
-  mode: 'ECB' | 'CBC' | 'CFB' | 'OFB' | 'CTR';
+  mode: AesMode;
   inputEncoding: Encoding;
   padding: boolean;
   text: string;
   keyHex: string;
   ivHex: string;
   counterHex: string;
+  counterWidth?: CounterWidth;
+  aadHex?: string;
+  tagLength?: number;
+  sector?: number;
+  sectorSize?: number;
+  engine?: 'reference' | 'ttable' | 'numpy';
+  trace?: TraceLevel;
+  offset?: number;
+  length?: number;
+  outputEncodings?: OutputEncoding[];
+  utf8PreviewLimit?: number;
 }
 
 export interface CipherResponse {
   output: {
-    hex: string;
-    base64: string;
-    utf8: string;
+    hex?: string;
+    base64?: string;
+    utf8?: string;
+    utf8Truncated?: boolean;
   };
-  encodingUsed: Encoding;
+  encodingUsed: Encoding | 'binary';
   autoPadded: boolean;
   ivUsed?: string;
   counterUsed?: string;
   steps: Step[];
+  trace?: {
+    level: TraceLevel;
+    blocks: number;
+    id?: string;
+    steps?: number;
+  };
+  range?: {
+    offset: number;
+    length: number;
+  } | null;
+}
+
+export interface TracePage {
+  id: string;
+  total: number;
+  offset: number;
+  steps: Step[];
 }
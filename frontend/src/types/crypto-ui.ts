@@ -1,5 +1,11 @@
-export type AesMode = 'ECB' | 'CBC' | 'CFB' | 'OFB' | 'CTR';
+export type AesMode = 'ECB' | 'CBC' | 'CFB' | 'OFB' | 'CTR' | 'GCM' | 'CCM' | 'XTS';
 
 export type Encoding = 'utf8' | 'hex' | 'base64';
 
 export type Operation = 'encrypt' | 'decrypt';
+
+export type TraceLevel = 'none' | 'summary' | 'full' | 'stored';
+
+export type CounterWidth = 32 | 64 | 128;
+
+export type OutputEncoding = 'hex' | 'base64' | 'utf8';
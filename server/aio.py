@@ -0,0 +1,596 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers, MIMEAccept
+from werkzeug.http import parse_accept_header, parse_options_header
+
+from server.server import (
+    ADMISSION_LIMITS,
+    BINARY_MIMETYPE,
+    CACHE_COUNTERS,
+    CACHE_GAUGES,
+    CORS_HEADERS,
+    METRIC_ENDPOINTS,
+    METRICS,
+    METRICS_CONTENT_TYPE,
+    PROFILE_STORE,
+    AdmissionError,
+    AdmissionLane,
+    PhaseTimer,
+    PendingTraces,
+    admission_lane,
+    batch_shards,
+    batch_summary,
+    binary_headers,
+    binary_payload,
+    cache_stats,
+    check_body_size,
+    check_stream_length,
+    commit_pending,
+    handle_cipher,
+    health_status,
+    merge_batch_shards,
+    profile_request,
+    run_profiled,
+    run_batch_shard,
+    stream_context,
+    stream_params,
+    trace_page_request,
+)
+
+# asyncio/ASGI serving mode: parsing and I/O stay on the event loop, cipher work runs in worker processes
+# usage (from the repo root, needs uvicorn):
+#   python -m server.aio --port 5000 --workers 4 --timeout 30
+#   uvicorn server.aio:app --port 5000
+
+DEFAULT_TIMEOUT = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+# worker job for /api/cipher; the worker's phase timings and profile travel back with the result
+def cipher_job(payload, data, binary_out, profiler=None):
+    traces = PendingTraces()
+    timer = PhaseTimer()
+    stacks = None
+    if profiler is None:
+        result = handle_cipher(payload, data, binary_out, traces, timer)
+    else:
+        result, stacks = run_profiled(profiler, handle_cipher, payload, data, binary_out, traces, timer)
+    return result, traces.pending, timer.phases, timer.bytes, stacks
+
+
+# the CipherContext of the /api/cipher/stream request a leased worker is serving
+WORKER_STREAM = {}
+
+
+# worker jobs for /api/cipher/stream; all of one stream's jobs go to the same leased worker
+def stream_open_job(params):
+    WORKER_STREAM["context"] = stream_context(**params)
+
+
+def stream_update_job(chunk):
+    return WORKER_STREAM["context"].update(chunk)
+
+
+def stream_final_job():
+    return WORKER_STREAM.pop("context").finalize()
+
+
+def stream_close_job():
+    WORKER_STREAM.pop("context", None)
+
+
+# worker process loop: one job at a time from the pipe, (ok, value, cache stats) back
+def worker_main(conn):
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            ok, value = True, func(*args)
+        except Exception as exc:
+            ok, value = False, str(exc)
+        conn.send((ok, value, cache_stats()))
+
+
+# one worker process plus the parent end of its pipe
+class Worker:
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+# a worker taken from the pool for a run of jobs, e.g. one stream's CipherContext
+class WorkerLease:
+    __slots__ = ("pool", "worker")
+
+    def __init__(self, pool, worker):
+        self.pool = pool
+        self.worker = worker
+
+    async def run(self, func, *args):
+        return await self.pool._call(self, func, args)
+
+
+# fixed set of worker processes; a job that times out or is cancelled takes its process down with it
+class WorkerPool:
+    def __init__(self, size=None):
+        self.size = size or os.cpu_count() or 1
+        self.jobs = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.busy = 0
+        self.waiting = 0
+        # spawn, not fork: the parent has threads (pipe I/O) by the time workers are replaced
+        self._ctx = multiprocessing.get_context("spawn")
+        self._io = ThreadPoolExecutor(max_workers=2 * self.size + 2, thread_name_prefix="worker-io")
+        self._idle = None
+        self._workers = []
+        # cache stats each worker sent with its last reply
+        self._caches = {}
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = Worker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    def _kill(self, worker):
+        self._workers.remove(worker)
+        self._caches.pop(worker, None)
+        worker.process.terminate()
+        worker.process.join(5)
+        worker.conn.close()
+
+    def _replace(self, worker):
+        self._kill(worker)
+        self.restarts += 1
+        return self._spawn()
+
+    async def start(self):
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        for _ in range(self.size):
+            self._idle.put_nowait(await loop.run_in_executor(self._io, self._spawn))
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for worker in list(self._workers):
+            await loop.run_in_executor(self._io, self._kill, worker)
+        self._idle = None
+        self._io.shutdown(wait=False)
+
+    # run func(*args) in a worker; wrap in asyncio.wait_for for a deadline
+    async def run(self, func, *args):
+        async with self.lease() as lease:
+            return await lease.run(func, *args)
+
+    # hold one worker until the block exits, so several jobs share its process state
+    @contextlib.asynccontextmanager
+    async def lease(self):
+        await self.start()
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        lease = WorkerLease(self, worker)
+        self.busy += 1
+        try:
+            yield lease
+        finally:
+            self.busy -= 1
+            self._idle.put_nowait(lease.worker)
+
+    async def _call(self, lease, func, args):
+        loop = asyncio.get_running_loop()
+        worker = lease.worker
+        self.jobs += 1
+        try:
+            await loop.run_in_executor(self._io, worker.conn.send, (func, args))
+            ok, value, caches = await loop.run_in_executor(self._io, worker.conn.recv)
+        except asyncio.CancelledError:
+            # a running job cannot be recalled, so its process is replaced
+            lease.worker = await asyncio.shield(loop.run_in_executor(self._io, self._replace, worker))
+            raise
+        except (EOFError, OSError):
+            lease.worker = await loop.run_in_executor(self._io, self._replace, worker)
+            self.failed += 1
+            raise RuntimeError("Cipher worker exited unexpectedly")
+        self._caches[worker] = caches
+        if not ok:
+            self.failed += 1
+            raise ValueError(value)
+        self.completed += 1
+        return value
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "jobs": self.jobs,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+        }
+
+    # the workers' key-schedule and keystream caches as one cache_stats() view, as of each worker's last job;
+    # counts are summed, limits are per worker
+    def cache_stats(self):
+        total = cache_stats()
+        for name, stats in total.items():
+            for field in stats:
+                if field in CACHE_COUNTERS or field in CACHE_GAUGES:
+                    stats[field] = sum(caches[name][field] for caches in self._caches.values())
+        return total
+
+
+# lane for the event loop: waiting requests park on a condition instead of holding a thread
+class AsyncAdmissionLane(AdmissionLane):
+    def __init__(self, name, concurrency, max_queue, max_wait):
+        super().__init__(name, concurrency, max_queue, max_wait)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with self._cond:
+            self._check_room()
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.active < self.concurrency), self.max_wait)
+            except asyncio.TimeoutError:
+                raise self._timeout() from None
+            finally:
+                self.queued -= 1
+            self._admit(loop.time() - start)
+
+    async def release(self):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+# the ASGI application
+class CipherApp:
+    def __init__(self, workers=None, timeout=DEFAULT_TIMEOUT):
+        self.pool = WorkerPool(workers)
+        self.timeout = timeout
+        # big jobs may hold at most half the workers, so small ones always find a free process
+        concurrency = {"small": self.pool.size, "large": max(1, self.pool.size // 2)}
+        self.lanes = {
+            name: AsyncAdmissionLane(name, concurrency[name], max_queue, max_wait)
+            for name, (_, max_queue, max_wait) in ADMISSION_LIMITS.items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.pool.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.pool.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        method = scope["method"]
+        path = scope["path"]
+        if method == "OPTIONS":
+            return await respond(send, 204, b"")
+        if path == "/api/health" and method == "GET":
+            admission = {name: lane.stats() for name, lane in self.lanes.items()}
+            status = dict(health_status(), **self.pool.cache_stats(), workers=self.pool.stats(), admission=admission)
+            return await respond_json(send, status)
+        if path == "/api/metrics" and method == "GET":
+            text = METRICS.render(self.pool.cache_stats())
+            return await respond(send, 200, text.encode("utf-8"), METRICS_CONTENT_TYPE)
+        if path in METRIC_ENDPOINTS:
+            send = counting_errors(send, path)
+        if path.startswith("/api/trace/") and method == "GET":
+            args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+            body, status = trace_page_request(path[len("/api/trace/") :], args)
+            return await (respond_json(send, body) if status == 200 else respond_text(send, status, body))
+        if path.startswith("/api/profile/") and method == "GET":
+            text = PROFILE_STORE.get(path[len("/api/profile/") :])
+            if text is None:
+                return await respond_text(send, 404, "Unknown or expired profile id")
+            return await respond_text(send, 200, text)
+        if path in ("/api/cipher", "/api/cipher/batch") and method == "POST":
+            headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+            try:
+                async with self._admission(headers):
+                    if path == "/api/cipher":
+                        return await self._cipher(scope, headers, receive, send)
+                    return await self._batch(receive, send)
+            except AdmissionError as exc:
+                return await respond(send, exc.status, str(exc).encode("utf-8"), extra_headers=exc.headers())
+        if path == "/api/cipher/stream" and method == "POST":
+            headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+            try:
+                return await self._stream(scope, headers, receive, send)
+            except AdmissionError as exc:
+                return await respond(send, exc.status, str(exc).encode("utf-8"), extra_headers=exc.headers())
+        return await respond_text(send, 404, "Not Found")
+
+    # body size cap, then a slot in the lane for the request's size, held until the response is sent
+    @contextlib.asynccontextmanager
+    async def _admission(self, headers):
+        length = headers.get("Content-Length", type=int)
+        check_body_size(length)
+        lane = self.lanes[admission_lane(length)]
+        await lane.acquire()
+        try:
+            yield
+        finally:
+            await lane.release()
+
+    async def _cipher(self, scope, headers, receive, send):
+        client = scope.get("client") or (None, None)
+        profiler = profile_request(headers.get("X-Cipher-Profile"), client[0])
+        timer = PhaseTimer()
+        accept = parse_accept_header(headers.get("Accept"), MIMEAccept)
+        binary_out = accept.best_match(["application/json", BINARY_MIMETYPE]) == BINARY_MIMETYPE
+        body = await read_body(receive)
+        timer.mark("read")
+        if parse_options_header(headers.get("Content-Type", ""))[0] == BINARY_MIMETYPE:
+            args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+            payload = binary_payload(args, headers)
+            data = body
+        else:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return await respond_text(send, 400, "Invalid JSON")
+            data = None
+        timer.mark("parse")
+        outcome = await self._offload(receive, send, self.pool.run(cipher_job, payload, data, binary_out, profiler))
+        if outcome is None:
+            return
+        result, pending, phases, size, stacks = outcome
+        # pickling, the pipe and waiting for a free worker show up as "worker"
+        timer.absorb(phases, "worker")
+        timer.bytes = size
+        commit_pending(result, pending)
+        if binary_out:
+            status, body, content_type, extra = 200, bytes(result["output"]), BINARY_MIMETYPE, binary_headers(result)
+        else:
+            status, body, content_type, extra = 200, json_body(result), "application/json", {}
+        timer.mark("serialize")
+        METRICS.observe(payload.get("mode"), payload.get("operation"), timer)
+        extra["Server-Timing"] = timer.header()
+        if stacks is not None:
+            extra["X-Cipher-Profile-Id"] = PROFILE_STORE.commit(stacks)
+        await respond(send, status, body, content_type, extra)
+
+    async def _batch(self, receive, send):
+        try:
+            payload = json.loads(await read_body(receive))
+        except ValueError:
+            return await respond_text(send, 400, "Invalid JSON")
+        items = payload.get("items") if isinstance(payload, dict) else payload
+        try:
+            shards = batch_shards(items, self.pool.size)
+        except ValueError as exc:
+            return await respond_text(send, 400, str(exc))
+        outcomes = await self._offload(receive, send, self._run_shards(items, shards))
+        if outcomes is None:
+            return
+        await respond_json(send, batch_summary(merge_batch_shards(len(items), shards, outcomes)))
+
+    # batch shards as concurrent worker jobs; when one fails the others are cancelled with it
+    async def _run_shards(self, items, shards):
+        jobs = [
+            asyncio.ensure_future(self.pool.run(run_batch_shard, [items[index] for index in shard])) for shard in shards
+        ]
+        try:
+            return await asyncio.gather(*jobs)
+        finally:
+            for job in jobs:
+                job.cancel()
+
+    # request body through a CipherContext held by one leased worker, chunk by chunk; like the Flask view,
+    # errors before the first output chunk get a 400 and later ones end the response without its final chunk
+    async def _stream(self, scope, headers, receive, send):
+        args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+        try:
+            params = stream_params(args)
+            check_stream_length(params, headers.get("Content-Length", type=int))
+        except ValueError as exc:
+            return await respond_text(send, 400, str(exc))
+        # streams have no size cap, but always take a large-lane slot, held until the last chunk is out
+        lane = self.lanes["large"]
+        await lane.acquire()
+        try:
+            async with self.pool.lease() as lease:
+                try:
+                    await self._stream_body(lease, params, receive, send, scope["path"])
+                finally:
+                    with contextlib.suppress(Exception):
+                        await asyncio.wait_for(lease.run(stream_close_job), self.timeout)
+        finally:
+            await lane.release()
+
+    async def _stream_body(self, lease, params, receive, send, path):
+        started = False
+        try:
+            await asyncio.wait_for(lease.run(stream_open_job, params), self.timeout)
+            more = True
+            while more:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                more = message.get("more_body", False)
+                chunk = message.get("body", b"")
+                if chunk:
+                    output = await asyncio.wait_for(lease.run(stream_update_job, chunk), self.timeout)
+                else:
+                    output = b""
+                if not more:
+                    output += await asyncio.wait_for(lease.run(stream_final_job), self.timeout)
+                if output or not more:
+                    if not started:
+                        await start_stream(send)
+                        started = True
+                    await send({"type": "http.response.body", "body": output, "more_body": more})
+        except (ValueError, RuntimeError, asyncio.TimeoutError) as exc:
+            if isinstance(exc, asyncio.TimeoutError):
+                self.pool.timeouts += 1
+                status, text = 504, f"Cipher request timed out after {self.timeout:g}s"
+            else:
+                status, text = (400 if isinstance(exc, ValueError) else 500), str(exc)
+            if not started:
+                return await respond_text(send, status, text)
+            # returning without the final body message makes the server drop the connection mid-transfer
+            logger.warning("%s aborted: %s", path, text)
+            METRICS.error(path, "aborted")
+
+    # await pool work under the request timeout; the work is cancelled if the client goes away
+    # returns its value, or None once an error response has been sent (or nobody is listening)
+    async def _offload(self, receive, send, work):
+        job = asyncio.ensure_future(asyncio.wait_for(work, self.timeout))
+        watcher = asyncio.ensure_future(wait_disconnect(receive))
+        await asyncio.wait({job, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not job.done():
+            self.pool.cancelled += 1
+            job.cancel()
+            await asyncio.gather(job, return_exceptions=True)
+            return None
+        watcher.cancel()
+        try:
+            return job.result()
+        except asyncio.TimeoutError:
+            self.pool.timeouts += 1
+            await respond_text(send, 504, f"Cipher request timed out after {self.timeout:g}s")
+        except ValueError as exc:
+            await respond_text(send, 400, str(exc))
+        except RuntimeError as exc:
+            await respond_text(send, 500, str(exc))
+        return None
+
+
+# whole request body, capped at MAX_BODY_BYTES
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        check_body_size(size)
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+# resolves when the client disconnects
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def respond(send, status, body, content_type="text/plain; charset=utf-8", extra_headers=None):
+    headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+    headers.update(extra_headers or {})
+    headers.update(CORS_HEADERS)
+    raw = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+
+# response head for a chunked octet stream; the body follows as more_body messages
+async def start_stream(send):
+    headers = {"Content-Type": BINARY_MIMETYPE}
+    headers.update(CORS_HEADERS)
+    raw = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+    await send({"type": "http.response.start", "status": 200, "headers": raw})
+
+
+async def respond_text(send, status, text):
+    await respond(send, status, text.encode("utf-8"))
+
+
+def json_body(body):
+    return json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+async def respond_json(send, body, status=200):
+    await respond(send, status, json_body(body), "application/json")
+
+
+# count error statuses on the way out, like count_errors in the Flask app
+def counting_errors(send, path):
+    async def wrapper(message):
+        if message["type"] == "http.response.start" and message["status"] >= 400:
+            METRICS.error(path, message["status"])
+        await send(message)
+
+    return wrapper
+
+
+def create_app(workers=None, timeout=DEFAULT_TIMEOUT):
+    return CipherApp(workers, timeout)
+
+
+app = create_app()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m server.aio", description="AES demo API on asyncio with a worker process pool")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None, help="cipher worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="per-request cipher timeout in seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        print("error: the asyncio server needs uvicorn (pip install uvicorn)", file=sys.stderr)
+        return 2
+    uvicorn.run(create_app(args.workers, args.timeout), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
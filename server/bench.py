@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from server.server import (
+    BLOCK_SIZE,
+    CIPHER_MODES,
+    DEFAULT_ENGINE,
+    ENGINES,
+    GCM_NONCE_SIZE,
+    KEY_CACHE,
+    XTS_SECTOR_SIZE,
+    decrypt_cbc,
+    decrypt_ccm,
+    decrypt_cfb,
+    decrypt_ctr,
+    decrypt_ecb,
+    decrypt_gcm,
+    decrypt_ofb,
+    decrypt_xts,
+    encrypt_cbc,
+    encrypt_ccm,
+    encrypt_cfb,
+    encrypt_ctr,
+    encrypt_ecb,
+    encrypt_gcm,
+    encrypt_ofb,
+    encrypt_xts,
+    np,
+)
+
+# usage (from the repo root):
+#   python -m server.bench                                   # default sizes, compare with the baseline
+#   python -m server.bench --sizes 16,1M,64M --engines all --output results.json
+#   python -m server.bench --output server/bench_baseline.json --no-compare   # refresh the baseline
+# baselines are machine-specific: refresh it on the machine the comparison runs on
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_SIZES = (16, 1 << 10, 64 << 10, 1 << 20)
+FULL_SIZES = (16, 1 << 10, 64 << 10, 1 << 20, 16 << 20, 64 << 20)
+KEY_BITS = (128, 192, 256)
+OPERATIONS = ("encrypt", "decrypt")
+TRACE_LEVELS = ("none", "full")
+# full traces build a dict per block, so they are only timed up to this size by default
+TRACE_MAX_SIZE = 64 << 10
+MIN_TIME = 0.2
+MAX_REPEATS = 1000
+REGRESSION_THRESHOLD = 0.3
+CCM_BENCH_NONCE_SIZE = 11
+
+# (mode, operation) -> call(key, data, state, round_keys, nr, engine, trace); padding stays off,
+# payload sizes are whole blocks
+MODE_CALLS = {
+    ("ECB", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_ecb(k, d, False, rk, nr, e, t),
+    ("ECB", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_ecb(k, d, False, rk, nr, e, t),
+    ("CBC", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_cbc(k, d, s, False, rk, nr, e, t),
+    ("CBC", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_cbc(k, d, s, False, rk, nr, e, t),
+    ("CFB", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_cfb(k, d, s, rk, nr, e, t),
+    ("CFB", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_cfb(k, d, s, rk, nr, e, t),
+    ("OFB", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_ofb(k, d, s, rk, nr, e, t),
+    ("OFB", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_ofb(k, d, s, rk, nr, e, t),
+    ("CTR", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_ctr(k, d, s, rk, nr, e, t),
+    ("CTR", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_ctr(k, d, s, rk, nr, e, t),
+    # GCM with a 96-bit nonce, no AAD and a full tag
+    ("GCM", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_gcm(k, d, s[:GCM_NONCE_SIZE], b"", 16, rk, nr, e, t),
+    ("GCM", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_gcm(k, d, s[:GCM_NONCE_SIZE], b"", 16, rk, nr, e, t),
+    # CCM with an 11-byte nonce: its 4-byte length field covers the --full sizes, a 96-bit nonce stops below 16 MB
+    ("CCM", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_ccm(k, d, s[:CCM_BENCH_NONCE_SIZE], b"", 16, rk, nr, e, t),
+    ("CCM", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_ccm(k, d, s[:CCM_BENCH_NONCE_SIZE], b"", 16, rk, nr, e, t),
+    # XTS from sector 0 with 512-byte sectors; the tweak key reuses the data schedule, which costs the same
+    ("XTS", "encrypt"): lambda k, d, s, rk, nr, e, t: encrypt_xts(k, d, 0, XTS_SECTOR_SIZE, rk, nr, rk, nr, e, t),
+    ("XTS", "decrypt"): lambda k, d, s, rk, nr, e, t: decrypt_xts(k, d, 0, XTS_SECTOR_SIZE, rk, nr, rk, nr, e, t),
+}
+# cases whose input must be real ciphertext: the payload is encrypted once before timing
+PREPARED_INPUTS = {
+    ("GCM", "decrypt"): ("GCM", "encrypt"),
+    ("CCM", "decrypt"): ("CCM", "encrypt"),
+}
+
+
+# fields that identify a benchmark case across runs
+def case_key(result):
+    return (result["engine"], result["mode"], result["operation"], result["keyBits"], result["size"], result["trace"])
+
+
+# best-of-N timing: repeat until MIN_TIME has passed (at least once, at most MAX_REPEATS)
+def time_case(call, key, data, state, round_keys, nr, engine, trace, min_time=MIN_TIME):
+    best = None
+    repeats = 0
+    started = time.perf_counter()
+    while repeats < MAX_REPEATS:
+        t0 = time.perf_counter()
+        call(key, data, state, round_keys, nr, engine, trace)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+        repeats += 1
+        if time.perf_counter() - started >= min_time:
+            break
+    return best, repeats
+
+
+def run_cases(modes, engines, sizes, key_bits, traces, trace_max_size, min_time, log=None):
+    results = []
+    state = bytes(range(BLOCK_SIZE))
+    payloads = {size: os.urandom(size) for size in sizes}
+    for engine in engines:
+        for bits in key_bits:
+            key = bytes(range(bits // 8))
+            _, nr, round_keys = KEY_CACHE.expand(key)
+            for mode in modes:
+                for operation in OPERATIONS:
+                    call = MODE_CALLS[(mode, operation)]
+                    prepare = PREPARED_INPUTS.get((mode, operation))
+                    for size in sizes:
+                        data = payloads[size]
+                        if prepare is not None:
+                            data, _ = MODE_CALLS[prepare](key, data, state, round_keys, nr, engine, "none")
+                        for trace in traces:
+                            if trace != "none" and size > trace_max_size:
+                                continue
+                            seconds, repeats = time_case(
+                                call, key, data, state, round_keys, nr, engine, trace, min_time
+                            )
+                            result = {
+                                "engine": engine,
+                                "mode": mode,
+                                "operation": operation,
+                                "keyBits": bits,
+                                "size": size,
+                                "trace": trace,
+                                "seconds": seconds,
+                                "repeats": repeats,
+                                "mbPerSec": round(size / seconds / 1e6, 4) if seconds > 0 else None,
+                                "usPerBlock": round(seconds / (size // BLOCK_SIZE) * 1e6, 3),
+                            }
+                            results.append(result)
+                            if log is not None:
+                                log(format_result(result))
+    return results
+
+
+def format_result(result):
+    return (
+        f"{result['engine']:9} {result['mode']} {result['operation']:7} AES-{result['keyBits']} "
+        f"{format_size(result['size']):>5} trace={result['trace']:4} "
+        f"{result['mbPerSec']:10.3f} MB/s {result['usPerBlock']:10.3f} us/block"
+    )
+
+
+def format_size(size):
+    for unit, shift in (("M", 20), ("K", 10)):
+        if size >= 1 << shift and size % (1 << shift) == 0:
+            return f"{size >> shift}{unit}"
+    return str(size)
+
+
+# "16,1K,64M" -> sizes in bytes, each a whole number of blocks
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().upper()
+        shift = {"K": 10, "M": 20}.get(part[-1:], 0)
+        value = int(part[:-1] if shift else part) << shift
+        if value < BLOCK_SIZE or value % BLOCK_SIZE:
+            raise ValueError(f"size {part} is not a whole number of {BLOCK_SIZE}-byte blocks")
+        sizes.append(value)
+    return sizes
+
+
+def parse_list(text, allowed, name):
+    if text == "all":
+        return list(allowed)
+    values = [part.strip() for part in text.split(",") if part.strip()]
+    for value in values:
+        if value not in allowed:
+            raise ValueError(f"unknown {name} {value} (expected one of: {', '.join(map(str, allowed))})")
+    return values
+
+
+# cases that got slower than baseline by more than threshold (a fraction of baseline MB/s)
+def compare(results, baseline, threshold):
+    previous = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None or not before["mbPerSec"] or result["mbPerSec"] is None:
+            continue
+        change = result["mbPerSec"] / before["mbPerSec"] - 1
+        if change < -threshold:
+            regressions.append((result, before, change))
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": None if np is None else np.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m server.bench", description="AES mode throughput benchmarks")
+    parser.add_argument("--modes", default="all", help="comma-separated modes (default all)")
+    parser.add_argument("--engines", default=DEFAULT_ENGINE, help=f"comma-separated engines or all (default {DEFAULT_ENGINE})")
+    parser.add_argument("--key-bits", default="all", help="comma-separated key sizes: 128,192,256 (default all)")
+    parser.add_argument("--sizes", default=None, help="comma-separated payload sizes, e.g. 16,1K,64M")
+    parser.add_argument("--full", action="store_true", help="use sizes from 16 B up to 64 MB")
+    parser.add_argument("--traces", default="all", help="trace levels to time: none,full (default both)")
+    parser.add_argument("--trace-max-size", default=str(TRACE_MAX_SIZE), help="largest payload timed with tracing on")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds to keep repeating each case")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--no-compare", action="store_true", help="skip the baseline comparison")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown as a fraction (default 0.3)")
+    parser.add_argument("--quiet", action="store_true", help="do not print each case")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        modes = parse_list(args.modes, CIPHER_MODES, "mode")
+        engines = parse_list(args.engines, ENGINES, "engine")
+        key_bits = [int(bits) for bits in parse_list(args.key_bits, [str(bits) for bits in KEY_BITS], "key size")]
+        traces = parse_list(args.traces, TRACE_LEVELS, "trace level")
+        sizes = parse_sizes(args.sizes) if args.sizes else list(FULL_SIZES if args.full else DEFAULT_SIZES)
+        trace_max_size = parse_sizes(args.trace_max_size)[0]
+        if "numpy" in engines and np is None:
+            raise ValueError("the numpy engine needs numpy installed")
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+    log = None if args.quiet else lambda line: print(line, file=sys.stderr)
+    results = run_cases(modes, engines, sizes, key_bits, traces, trace_max_size, args.min_time, log)
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+            fh.write("\n")
+
+    if args.no_compare:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; nothing to compare", file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    regressions = compare(results, baseline, args.threshold)
+    for result, before, change in regressions:
+        print(f"REGRESSION {format_result(result)} (baseline {before['mbPerSec']:.3f} MB/s, {change:+.1%})")
+    known = {case_key(result) for result in baseline["results"]}
+    matched = sum(1 for result in results if case_key(result) in known)
+    print(f"{matched} cases compared with {args.baseline}: {len(regressions)} slower than -{args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
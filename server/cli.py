@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from server.server import (
+    BLOCK_SIZE,
+    COUNTER_WIDTHS,
+    DEFAULT_ENGINE,
+    ENGINES,
+    KEY_CACHE,
+    SECTOR_MODES,
+    STREAM_MODES,
+    XTS_SECTOR_SIZE,
+    check_stream_length,
+    decrypt_xts,
+    default_counter,
+    encrypt_ctr_range,
+    encrypt_xts,
+    hex_to_bytes,
+    new_context,
+    parse_sectors,
+    xts_schedules,
+)
+
+# usage (from the repo root):
+#   python -m server.cli encrypt --mode CTR --key 000102... in.bin out.bin
+#   python -m server.cli decrypt --mode CBC --key 000102... --iv 0f0e... in.bin out.bin
+#   python -m server.cli decrypt --mode CTR --key 000102... --offset 4096 --length 512 in.bin part.bin
+#   python -m server.cli decrypt --mode XTS --key <64 hex bytes> --offset 1048576 --length 4096 disk.img part.bin
+
+WINDOW_SIZE = 4 * 1024 * 1024
+
+
+# output size is known up front except for padded decrypt, which shrinks at the end
+def output_size(operation, mode, size, pad):
+    if operation == "encrypt" and mode in ("ECB", "CBC") and pad:
+        return size + BLOCK_SIZE - size % BLOCK_SIZE
+    return size
+
+
+# run a cipher context over a mapped input, writing into a mapped output
+def run_file(context, src, dst, window):
+    view = memoryview(src)
+    out = memoryview(dst)
+    written = 0
+    try:
+        for offset in range(0, len(view), window):
+            written += context.update_into(view[offset : offset + window], out[written:])
+        tail = context.finalize()
+        out[written : written + len(tail)] = tail
+        return written + len(tail)
+    finally:
+        view.release()
+        out.release()
+
+
+# CTR over src[offset:offset + length] only, one window at a time
+def run_ctr_range(key, counter, src, dst, offset, length, window, engine, counter_width):
+    _, nr, round_keys = KEY_CACHE.expand(key)
+    view = memoryview(src)
+    end = offset + length
+    written = 0
+    pos = offset
+    try:
+        while pos < end:
+            # after the first window every window starts block-aligned
+            stop = min(end, pos - pos % BLOCK_SIZE + window)
+            output, _ = encrypt_ctr_range(key, view[pos:stop], counter, pos, round_keys, nr, engine, "none", None, counter_width)
+            dst[written : written + len(output)] = output
+            written += len(output)
+            pos = stop
+    finally:
+        view.release()
+    return written
+
+
+# XTS over src[offset:offset + length] (offset on a sector boundary), whole sectors per window;
+# sector numbers follow the position in the file, so any range decrypts on its own
+def run_xts_file(key_hex, operation, first_sector, sector_size, src, dst, offset, length, window, engine):
+    (nr, round_keys), (tweak_nr, tweak_round_keys) = xts_schedules(key_hex)
+    crypt = encrypt_xts if operation == "encrypt" else decrypt_xts
+    window = max(sector_size, window - window % sector_size)
+    view = memoryview(src)
+    end = offset + length
+    written = 0
+    try:
+        for pos in range(offset, end, window):
+            chunk = view[pos : min(end, pos + window)]
+            sector = first_sector + pos // sector_size
+            output, _ = crypt(None, chunk, sector, sector_size, round_keys, nr, tweak_round_keys, tweak_nr, engine, "none")
+            dst[written : written + len(output)] = output
+            written += len(output)
+    finally:
+        view.release()
+    return written
+
+
+# map a file read-only; mmap cannot map empty files
+def map_input(fh, size):
+    if size == 0:
+        return b""
+    return mmap.mmap(fh.fileno(), size, access=mmap.ACCESS_READ)
+
+
+# a new file next to the output, created the way open() would create it; it replaces the output only once the
+# whole run succeeded, so a failed run leaves an existing output untouched and no partial one behind
+def open_temp_output(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    temp = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    return temp, os.fdopen(os.open(temp, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666), "w+b")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m server.cli", description="AES file encryption over memory-mapped files")
+    parser.add_argument("operation", choices=("encrypt", "decrypt"))
+    parser.add_argument("input", help="input file")
+    parser.add_argument("output", help="output file (created or overwritten)")
+    parser.add_argument("--mode", required=True, choices=STREAM_MODES + SECTOR_MODES)
+    parser.add_argument("--key", required=True, help="key as hex (16/24/32 bytes; XTS: 32/64 bytes, data key then tweak key)")
+    parser.add_argument("--iv", default="", help="IV as hex for CBC/CFB/OFB (default zeros)")
+    parser.add_argument("--counter", default="", help="initial counter as hex for CTR (default zeros)")
+    parser.add_argument("--no-padding", action="store_true", help="disable zero-count padding for ECB/CBC")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, choices=ENGINES)
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="bytes per processing window")
+    parser.add_argument("--counter-width", type=int, default=128, choices=COUNTER_WIDTHS, help="CTR counter field size in bits")
+    parser.add_argument("--sector", type=int, default=0, help="XTS: sector number of the first byte of the file")
+    parser.add_argument("--sector-size", type=int, default=XTS_SECTOR_SIZE, help=f"XTS: bytes per sector (default {XTS_SECTOR_SIZE})")
+    parser.add_argument("--offset", type=int, default=None, help="CTR/XTS only: first byte of the range to process")
+    parser.add_argument("--length", type=int, default=None, help="CTR/XTS only: number of bytes to process")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        key = hex_to_bytes(args.key)
+        state_hex = args.counter if args.mode == "CTR" else args.iv
+        state = hex_to_bytes(state_hex) if state_hex.strip() else None
+        if args.window < BLOCK_SIZE:
+            raise ValueError(f"--window must be at least {BLOCK_SIZE} bytes")
+        window = args.window - args.window % BLOCK_SIZE
+        pad = args.mode in ("ECB", "CBC") and not args.no_padding
+        sectored = args.mode in SECTOR_MODES
+        if sectored:
+            # validate the key pair before any file is touched
+            xts_schedules(args.key)
+            first_sector, sector_size = parse_sectors(args.sector, args.sector_size)
+            context = None
+        else:
+            context = new_context(args.mode, key, args.operation, state, pad, args.engine, args.counter_width)
+        ranged = args.offset is not None or args.length is not None
+        if ranged and args.mode not in ("CTR",) + SECTOR_MODES:
+            raise ValueError("--offset/--length are only supported for CTR and XTS")
+        if ranged and ((args.offset or 0) < 0 or (args.length or 0) < 0):
+            raise ValueError("--offset and --length must be non-negative")
+        if sectored and (args.offset or 0) % sector_size:
+            raise ValueError(f"XTS --offset must be a multiple of the sector size ({sector_size})")
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+    size = os.path.getsize(args.input)
+    if ranged and (args.offset or 0) > size:
+        print(f"error: --offset {args.offset} is past the end of the {size}-byte input", file=sys.stderr)
+        return 2
+    if ranged or sectored:
+        offset = args.offset or 0
+        length = size - offset if args.length is None else min(args.length, size - offset)
+        out_size = length
+        # a short sector is only allowed at the end of the input, where ciphertext stealing applies
+        if sectored and length % sector_size and offset + length < size:
+            print(
+                f"error: XTS --length must be a multiple of the sector size ({sector_size}) unless the range reaches the end of the input",
+                file=sys.stderr,
+            )
+            return 2
+    else:
+        out_size = output_size(args.operation, args.mode, size, pad)
+    # errors the input size alone proves, caught before the output is touched
+    if not sectored:
+        counter = (state if state is not None else default_counter()) if ranged else context.state
+        params = {"mode": args.mode, "operation": args.operation, "counter": counter, "counter_width": args.counter_width}
+        try:
+            check_stream_length(params, offset + length if ranged else size)
+        except ValueError as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 2
+    start = time.perf_counter()
+    temp, dst_fh = open_temp_output(args.output)
+    done = False
+    try:
+        with open(args.input, "rb") as src_fh, dst_fh:
+            dst_fh.truncate(out_size)
+            src = map_input(src_fh, size)
+            dst = mmap.mmap(dst_fh.fileno(), out_size) if out_size else bytearray()
+            try:
+                if sectored:
+                    written = run_xts_file(
+                        args.key, args.operation, first_sector, sector_size, src, dst, offset, length, window, args.engine
+                    )
+                elif ranged:
+                    written = run_ctr_range(key, counter, src, dst, offset, length, window, args.engine, args.counter_width)
+                else:
+                    written = run_file(context, src, dst, window)
+            except ValueError as exc:
+                print(f"error: {exc}", file=sys.stderr)
+                return 1
+            finally:
+                if isinstance(dst, mmap.mmap):
+                    dst.flush()
+                    dst.close()
+                if isinstance(src, mmap.mmap):
+                    src.close()
+            if written != out_size:
+                dst_fh.truncate(written)
+        done = True
+    finally:
+        # the temp file is closed by now; a failed run removes it and leaves the output as it was
+        if not done:
+            os.unlink(temp)
+    os.replace(temp, args.output)
+    elapsed = time.perf_counter() - start
+
+    processed = out_size if ranged else size
+    rate = processed / elapsed / 1e6 if elapsed > 0 else float("inf")
+    print(f"{args.operation}ed {processed} bytes ({args.mode}, {args.engine}) in {elapsed:.3f}s: {rate:.2f} MB/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,37 @@
 from __future__ import annotations
 
 import base64
+import binascii
+import bisect
+import functools
+import hashlib
+import hmac
 import json
+import math
+import multiprocessing
+import os
 import re
-from flask import Flask, jsonify, request
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+try:
+    import numpy as np
+except ImportError:  # numpy engine is optional
+    np = None
+
+try:
+    binascii.a2b_base64(b"", strict_mode=True)
+    STRICT_BASE64 = True
+except TypeError:  # strict_mode is Python 3.11+
+    STRICT_BASE64 = False
 
 app = Flask(__name__)
 
@@ -17,6 +45,11 @@ def bytes_to_hex(data):
 # parse hex string
 #Chat GPT helped with error handling and regex syntax
 def hex_to_bytes(data):
+    # fromhex skips whitespace between byte pairs, so most input decodes in one pass
+    try:
+        return bytes.fromhex(data)
+    except ValueError:
+        pass
     cleaned = re.sub(r"\s+", "", data).lower()
     if len(cleaned) % 2 != 0:
         raise ValueError("Hex string length must be even")
@@ -35,6 +68,8 @@ def bytes_to_base64(data):
 #Chat GPT helped with error Handling here
 def base64_to_bytes(data):
     try:
+        if STRICT_BASE64:
+            return binascii.a2b_base64(data, strict_mode=True)
         return base64.b64decode(data, validate=True)
     except Exception as exc: 
         raise ValueError("Invalid base64 string") from exc
@@ -54,7 +89,7 @@ def utf8_to_string(data):
 def pad_zero_count(data, block_size):
     remainder = len(data) % block_size
     pad_len = block_size if remainder == 0 else block_size - remainder
-    return data + bytes([0] * (pad_len - 1) + [pad_len])
+    return b"".join((data, bytes(pad_len - 1), bytes([pad_len])))
 
 
 # strip zero-count pad
@@ -771,9 +806,447 @@ def decrypt_block(block, round_keys, nr):
     return bytes(state)
 
 
-# xor byte strings
+# T-table round tables (SubBytes+ShiftRows+MixColumns folded into u32 lookups)
+def ror_word(w, n):
+    return ((w >> n) | (w << (32 - n))) & 0xFFFFFFFF
+
+
+def build_round_tables(sbox, coeffs):
+    t0 = []
+    for x in range(256):
+        s = sbox[x]
+        t0.append(
+            (gf_mul(s, coeffs[0]) << 24)
+            | (gf_mul(s, coeffs[1]) << 16)
+            | (gf_mul(s, coeffs[2]) << 8)
+            | gf_mul(s, coeffs[3])
+        )
+    return t0, [ror_word(w, 8) for w in t0], [ror_word(w, 16) for w in t0], [ror_word(w, 24) for w in t0]
+
+
+TE0, TE1, TE2, TE3 = build_round_tables(SBOX, (2, 1, 1, 3))
+TD0, TD1, TD2, TD3 = build_round_tables(INV_SBOX, (0x0E, 0x09, 0x0D, 0x0B))
+
+
+# round keys as u32 words, plus pre-transformed keys for the equivalent inverse cipher
+def ttable_round_keys(round_keys, nr):
+    total_words = 4 * (nr + 1)
+    ek = list(struct.unpack(f">{total_words}I", round_keys[: total_words * 4]))
+    dk = []
+    for rnd in range(nr, -1, -1):
+        words = ek[rnd * 4 : rnd * 4 + 4]
+        if 0 < rnd < nr:
+            # InvMixColumns on the key word; SBOX cancels the INV_SBOX folded into TD
+            words = [
+                TD0[SBOX[w >> 24]] ^ TD1[SBOX[(w >> 16) & 0xFF]] ^ TD2[SBOX[(w >> 8) & 0xFF]] ^ TD3[SBOX[w & 0xFF]]
+                for w in words
+            ]
+        dk.extend(words)
+    return ek, dk
+
+
+# AES encrypt block (T-table engine)
+def ttable_encrypt_block(block, ek, nr):
+    if len(block) != BLOCK_SIZE:
+        raise ValueError("AES block must be 16 bytes")
+    te0, te1, te2, te3, sbox = TE0, TE1, TE2, TE3, SBOX
+    s0, s1, s2, s3 = struct.unpack(">4I", block)
+    s0 ^= ek[0]
+    s1 ^= ek[1]
+    s2 ^= ek[2]
+    s3 ^= ek[3]
+    k = 4
+    for _ in range(nr - 1):
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ ek[k]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ ek[k + 1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ ek[k + 2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ ek[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+    return struct.pack(
+        ">4I",
+        ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ ek[k],
+        ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ ek[k + 1],
+        ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ ek[k + 2],
+        ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ ek[k + 3],
+    )
+
+
+# AES decrypt block (T-table engine, equivalent inverse cipher)
+def ttable_decrypt_block(block, dk, nr):
+    if len(block) != BLOCK_SIZE:
+        raise ValueError("AES block must be 16 bytes")
+    td0, td1, td2, td3, inv_sbox = TD0, TD1, TD2, TD3, INV_SBOX
+    s0, s1, s2, s3 = struct.unpack(">4I", block)
+    s0 ^= dk[0]
+    s1 ^= dk[1]
+    s2 ^= dk[2]
+    s3 ^= dk[3]
+    k = 4
+    for _ in range(nr - 1):
+        t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ dk[k]
+        t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ dk[k + 1]
+        t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ dk[k + 2]
+        t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ dk[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+    return struct.pack(
+        ">4I",
+        ((inv_sbox[s0 >> 24] << 24) | (inv_sbox[(s3 >> 16) & 0xFF] << 16) | (inv_sbox[(s2 >> 8) & 0xFF] << 8) | inv_sbox[s1 & 0xFF]) ^ dk[k],
+        ((inv_sbox[s1 >> 24] << 24) | (inv_sbox[(s0 >> 16) & 0xFF] << 16) | (inv_sbox[(s3 >> 8) & 0xFF] << 8) | inv_sbox[s2 & 0xFF]) ^ dk[k + 1],
+        ((inv_sbox[s2 >> 24] << 24) | (inv_sbox[(s1 >> 16) & 0xFF] << 16) | (inv_sbox[(s0 >> 8) & 0xFF] << 8) | inv_sbox[s3 & 0xFF]) ^ dk[k + 2],
+        ((inv_sbox[s3 >> 24] << 24) | (inv_sbox[(s2 >> 16) & 0xFF] << 16) | (inv_sbox[(s1 >> 8) & 0xFF] << 8) | inv_sbox[s0 & 0xFF]) ^ dk[k + 3],
+    )
+
+
+# NumPy engine tables; state byte r + 4c of block n lives at state[n, r + 4c]
+if np is not None:
+    SBOX_NP = np.array(SBOX, dtype=np.uint8)
+    INV_SBOX_NP = np.array(INV_SBOX, dtype=np.uint8)
+    XTIME_NP = np.array([gf_mul(x, 2) for x in range(256)], dtype=np.uint8)
+    SHIFT_ROWS_NP = np.array([(i % 4) + 4 * ((i // 4 + i % 4) % 4) for i in range(BLOCK_SIZE)])
+    INV_SHIFT_ROWS_NP = np.array([(i % 4) + 4 * ((i // 4 - i % 4) % 4) for i in range(BLOCK_SIZE)])
+
+# blocks per numpy pass, keeps temporaries around 256 KiB each
+NUMPY_CHUNK_BLOCKS = 1 << 14
+
+
+# round keys as a (nr + 1, 16) uint8 array
+def numpy_round_keys(round_keys, nr):
+    if np is None:
+        raise ValueError("NumPy engine requires numpy (pip install numpy)")
+    return np.frombuffer(bytes(round_keys[: (nr + 1) * BLOCK_SIZE]), dtype=np.uint8).reshape(nr + 1, BLOCK_SIZE).copy()
+
+
+# MixColumns on all blocks: out_r = a_r ^ (a0 ^ a1 ^ a2 ^ a3) ^ xtime(a_r ^ a_r+1)
+def numpy_mix_columns(state):
+    cols = state.reshape(-1, 4, 4)
+    a0, a1, a2, a3 = cols[:, :, 0], cols[:, :, 1], cols[:, :, 2], cols[:, :, 3]
+    total = a0 ^ a1 ^ a2 ^ a3
+    out = np.empty_like(cols)
+    out[:, :, 0] = a0 ^ total ^ XTIME_NP.take(a0 ^ a1)
+    out[:, :, 1] = a1 ^ total ^ XTIME_NP.take(a1 ^ a2)
+    out[:, :, 2] = a2 ^ total ^ XTIME_NP.take(a2 ^ a3)
+    out[:, :, 3] = a3 ^ total ^ XTIME_NP.take(a3 ^ a0)
+    return out.reshape(-1, BLOCK_SIZE)
+
+
+# InvMixColumns on all blocks: fold the {04}/{05} terms in first, then reuse MixColumns
+def numpy_inv_mix_columns(state):
+    cols = state.reshape(-1, 4, 4).copy()
+    even = XTIME_NP.take(XTIME_NP.take(cols[:, :, 0] ^ cols[:, :, 2]))
+    odd = XTIME_NP.take(XTIME_NP.take(cols[:, :, 1] ^ cols[:, :, 3]))
+    cols[:, :, 0] ^= even
+    cols[:, :, 1] ^= odd
+    cols[:, :, 2] ^= even
+    cols[:, :, 3] ^= odd
+    return numpy_mix_columns(cols)
+
+
+# AES encrypt many blocks (NumPy engine)
+def numpy_encrypt_blocks(data, rk, nr):
+    if len(data) % BLOCK_SIZE != 0:
+        raise ValueError("Input length must be a multiple of 16 bytes")
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, BLOCK_SIZE)
+    output = np.empty_like(blocks)
+    for start in range(0, len(blocks), NUMPY_CHUNK_BLOCKS):
+        state = blocks[start : start + NUMPY_CHUNK_BLOCKS] ^ rk[0]
+        for rnd in range(1, nr):
+            state = numpy_mix_columns(SBOX_NP.take(state[:, SHIFT_ROWS_NP]))
+            state ^= rk[rnd]
+        state = SBOX_NP.take(state[:, SHIFT_ROWS_NP])
+        state ^= rk[nr]
+        output[start : start + NUMPY_CHUNK_BLOCKS] = state
+    return output.tobytes()
+
+
+# AES decrypt many blocks (NumPy engine)
+def numpy_decrypt_blocks(data, rk, nr):
+    if len(data) % BLOCK_SIZE != 0:
+        raise ValueError("Input length must be a multiple of 16 bytes")
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, BLOCK_SIZE)
+    output = np.empty_like(blocks)
+    for start in range(0, len(blocks), NUMPY_CHUNK_BLOCKS):
+        state = blocks[start : start + NUMPY_CHUNK_BLOCKS] ^ rk[nr]
+        for rnd in range(nr - 1, 0, -1):
+            state = INV_SBOX_NP.take(state[:, INV_SHIFT_ROWS_NP])
+            state ^= rk[rnd]
+            state = numpy_inv_mix_columns(state)
+        state = INV_SBOX_NP.take(state[:, INV_SHIFT_ROWS_NP])
+        state ^= rk[0]
+        output[start : start + NUMPY_CHUNK_BLOCKS] = state
+    return output.tobytes()
+
+
+ENGINES = ("reference", "ttable", "numpy")
+DEFAULT_ENGINE = "ttable"
+
+# per-engine key material derived from the round keys; "ghash" is the key's GCM multiplication tables
+ENGINE_TABLE_BUILDERS = {
+    "ttable": ttable_round_keys,
+    "numpy": numpy_round_keys,
+    "ghash": lambda round_keys, nr: ghash_tables(round_keys, nr),
+}
+
+
+# overwrite cached key material in place
+def wipe_key_material(obj):
+    if isinstance(obj, bytearray):
+        obj[:] = bytes(len(obj))
+    elif isinstance(obj, list):
+        # nested tables (GHASH) are wiped row by row
+        if obj and isinstance(obj[0], list):
+            for row in obj:
+                wipe_key_material(row)
+        obj[:] = [0] * len(obj)
+    elif isinstance(obj, tuple):
+        for item in obj:
+            wipe_key_material(item)
+    elif np is not None and isinstance(obj, np.ndarray):
+        obj.fill(0)
+
+
+# private copy of cached key material, so eviction never wipes something in use; the copy belongs to the
+# request and is simply dropped when it ends, only the cache's own copy is ever wiped
+def copy_key_material(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return bytes(obj)
+    if isinstance(obj, list):
+        if obj and isinstance(obj[0], list):
+            return [list(row) for row in obj]
+        return list(obj)
+    if isinstance(obj, tuple):
+        return tuple(copy_key_material(item) for item in obj)
+    if np is not None and isinstance(obj, np.ndarray):
+        return obj.copy()
+    return obj
+
+
+# bounded LRU of expanded keys (+ engine tables), indexed by a keyed hash of the key; eviction and TTL
+# expiry wipe the cached schedule and tables, while callers get private copies that are never wiped
+# (an in-flight request must not see its key zeroed), so wiping bounds how long the cache itself keeps a key
+# hits and misses count schedule lookups (expand), one per request; engine tables ride on the same entry
+class KeyScheduleCache:
+    def __init__(self, max_entries=64, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, key):
+        return hashlib.blake2b(bytes(key), key=self._secret, digest_size=16).digest()
+
+    def _lookup(self, digest, now):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if now - entry["created"] > self.ttl:
+            self._drop(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return entry
+
+    def _drop(self, digest):
+        entry = self._entries.pop(digest)
+        wipe_key_material(entry["round_keys"])
+        for tables in entry["tables"].values():
+            wipe_key_material(tables)
+        self.evictions += 1
+
+    def _insert(self, digest, nk, nr, round_keys, now):
+        entry = {"nk": nk, "nr": nr, "round_keys": bytearray(round_keys), "tables": {}, "created": now}
+        self._entries[digest] = entry
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+        return entry
+
+    # expand_key with caching, same return shape
+    def expand(self, key):
+        digest = self._digest(key)
+        with self._lock:
+            entry = self._lookup(digest, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                return entry["nk"], entry["nr"], bytes(entry["round_keys"])
+            self.misses += 1
+        nk, nr, round_keys = expand_key(key)
+        with self._lock:
+            self._insert(digest, nk, nr, round_keys, time.monotonic())
+        return nk, nr, round_keys
+
+    # engine tables for a schedule; round keys start with the raw key words
+    def tables(self, engine, round_keys, nr):
+        builder = ENGINE_TABLE_BUILDERS[engine]
+        digest = self._digest(round_keys[: (nr - 6) * 4])
+        with self._lock:
+            now = time.monotonic()
+            entry = self._lookup(digest, now)
+            if entry is None:
+                entry = self._insert(digest, nr - 6, nr, round_keys, now)
+            elif engine in entry["tables"]:
+                return copy_key_material(entry["tables"][engine])
+        tables = builder(round_keys, nr)
+        with self._lock:
+            if self._entries.get(digest) is entry:
+                entry["tables"].setdefault(engine, copy_key_material(tables))
+        return tables
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+KEY_CACHE = KeyScheduleCache()
+
+
+# OFB/CTR keystream prefixes per (key, mode, IV/counter), grown on demand, evicted by total bytes
+class KeystreamCache:
+    def __init__(self, max_bytes=16 << 20, max_entry_bytes=1 << 20, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, key, mode, state, width):
+        h = hashlib.blake2b(key=self._secret, digest_size=16)
+        h.update(bytes([len(key)]) + bytes(key) + mode.encode("ascii") + bytes(state) + width.to_bytes(2, "big"))
+        return h.digest()
+
+    def _drop(self, digest):
+        entry = self._entries.pop(digest)
+        self.bytes -= len(entry["stream"])
+        wipe_key_material(entry["stream"])
+        self.evictions += 1
+
+    # first n_blocks of keystream; build(prefix, n) returns the n blocks that follow prefix
+    def keystream(self, key, mode, state, n_blocks, build, width=128):
+        need = n_blocks * BLOCK_SIZE
+        if need > min(self.max_entry_bytes, self.max_bytes):
+            with self._lock:
+                self.bypassed += 1
+            return build(b"", n_blocks)
+        digest = self._digest(key, mode, state, width)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and time.monotonic() - entry["created"] > self.ttl:
+                self._drop(digest)
+                entry = None
+            if entry is not None and len(entry["stream"]) >= need:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return bytes(entry["stream"][:need])
+            prefix = b"" if entry is None else bytes(entry["stream"])
+            created = time.monotonic() if entry is None else entry["created"]
+            if entry is None:
+                self.misses += 1
+            else:
+                self.extensions += 1
+        stream = prefix + build(prefix, n_blocks - len(prefix) // BLOCK_SIZE)
+        with self._lock:
+            entry = self._entries.get(digest)
+            # a concurrent request may have stored a longer prefix already
+            if entry is None or len(entry["stream"]) < len(stream):
+                if entry is not None:
+                    self._drop(digest)
+                    self.evictions -= 1
+                self._entries[digest] = {"stream": bytearray(stream), "created": created}
+                self.bytes += len(stream)
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+        return stream
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+                "maxEntryBytes": self.max_entry_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "extensions": self.extensions,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+            }
+
+
+KEYSTREAM_CACHE = KeystreamCache()
+
+
+# pick block encrypt/decrypt functions for an engine
+def block_funcs(engine, round_keys, nr):
+    if engine == "reference":
+        return (
+            lambda block: encrypt_block(block, round_keys, nr),
+            lambda block: decrypt_block(block, round_keys, nr),
+        )
+    if engine == "ttable":
+        ek, dk = KEY_CACHE.tables(engine, round_keys, nr)
+        return (
+            lambda block: ttable_encrypt_block(block, ek, nr),
+            lambda block: ttable_decrypt_block(block, dk, nr),
+        )
+    if engine == "numpy":
+        # one block at a time gains nothing from vectorizing, so serial chains use T-tables
+        return block_funcs("ttable", round_keys, nr)
+    raise ValueError(f"Unknown engine (expected one of: {', '.join(ENGINES)})")
+
+
+# pick multi-block encrypt/decrypt functions (16n bytes in, 16n bytes out) for an engine
+def batch_funcs(engine, round_keys, nr):
+    if engine == "numpy":
+        rk = KEY_CACHE.tables(engine, round_keys, nr)
+        return (
+            lambda data: numpy_encrypt_blocks(data, rk, nr),
+            lambda data: numpy_decrypt_blocks(data, rk, nr),
+        )
+    encrypt, decrypt = block_funcs(engine, round_keys, nr)
+    return (
+        lambda data: b"".join(encrypt(block) for block in split_blocks(data)),
+        lambda data: b"".join(decrypt(block) for block in split_blocks(data)),
+    )
+
+
+# xor byte strings (truncates to the shorter one)
 def xor_bytes(a, b):
-    return bytes(x ^ y for x, y in zip(a, b))
+    n = min(len(a), len(b))
+    return (int.from_bytes(a[:n], "big") ^ int.from_bytes(b[:n], "big")).to_bytes(n, "big")
+
+
+# xor two equal-length buffers in one big-int op
+def xor_bulk(a, b):
+    if len(a) != len(b):
+        raise ValueError("XOR operands must be the same length")
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
 
 
 # check block size
@@ -782,208 +1255,883 @@ def ensure_block(label, value):
         raise ValueError(f"{label} must be {BLOCK_SIZE} bytes")
 
 
-# chunk into 16-byte blocks
+# 16-byte block views over data, no copies
 def split_blocks(data):
-    return [data[i : i + BLOCK_SIZE] for i in range(0, len(data), BLOCK_SIZE)]
+    view = memoryview(data)
+    return (view[i : i + BLOCK_SIZE] for i in range(0, len(view), BLOCK_SIZE))
+
+
+# mode functions append steps to `sink` instead of a fresh list when one is given
+TRACE_LEVELS = ("none", "summary", "full")
+TRACE_SUMMARY_BLOCKS = 4
+
+
+# traced blocks are idx < head or idx >= tail
+def trace_window(n_blocks, trace):
+    if trace == "none":
+        return 0, n_blocks
+    if trace == "summary":
+        head = min(TRACE_SUMMARY_BLOCKS, n_blocks)
+        return head, max(n_blocks - TRACE_SUMMARY_BLOCKS, head)
+    if trace == "full":
+        return n_blocks, n_blocks
+    raise ValueError(f"Unknown trace level (expected one of: {', '.join(TRACE_LEVELS)})")
+
+
+# indices of traced blocks, in order
+def traced_blocks(n_blocks, trace):
+    head, tail = trace_window(n_blocks, trace)
+    return [*range(head), *range(tail, n_blocks)]
+
+
+# placeholder step for the blocks a summary trace leaves out
+def omitted_step(head, tail):
+    return {"title": f"Blocks {head + 1}-{tail} omitted", "fields": []}
+
+
+# add the omitted marker to a summary trace
+def close_trace(steps, n_blocks, trace):
+    head, tail = trace_window(n_blocks, trace)
+    if trace == "summary" and tail > head:
+        steps.insert(head, omitted_step(head, tail))
+    return steps
+
+
+# number of 16-byte blocks (last one may be partial)
+def block_count(length):
+    return -(-length // BLOCK_SIZE)
 
 
 # ECB encrypt
-def encrypt_ecb(key, plaintext, pad, round_keys, nr):
+def encrypt_ecb(key, plaintext, pad, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    encrypt_blocks, _ = batch_funcs(engine, round_keys, nr)
     data = pad_zero_count(plaintext, BLOCK_SIZE) if pad else plaintext
     if not pad and len(data) % BLOCK_SIZE != 0:
         raise ValueError("Input length must align to block size when padding is disabled")
-    output = bytearray()
-    steps: List[Dict] = []
-    for idx, block in enumerate(split_blocks(data)):
-        cipher = encrypt_block(block, round_keys, nr)
-        output.extend(cipher)
+    output = encrypt_blocks(data)
+    n_blocks = block_count(len(data))
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
+        block = data[offset : offset + BLOCK_SIZE]
+        cipher = output[offset : offset + BLOCK_SIZE]
         steps.append(
           {"title": f"Block {idx + 1}", "fields": [{"label": "Input", "value": bytes_to_hex(block)}, {"label": "Cipher", "value": bytes_to_hex(cipher)}]}
         )
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
 
 
 # ECB decrypt
-def decrypt_ecb(key, ciphertext, pad, round_keys, nr):
+def decrypt_ecb(key, ciphertext, pad, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    _, decrypt_blocks = batch_funcs(engine, round_keys, nr)
     if len(ciphertext) % BLOCK_SIZE != 0:
         raise ValueError("Ciphertext length must align to block size")
-    output = bytearray()
-    steps = []
-    for idx, block in enumerate(split_blocks(ciphertext)):
-        plain = decrypt_block(block, round_keys, nr)
-        output.extend(plain)
+    output = decrypt_blocks(ciphertext)
+    n_blocks = block_count(len(ciphertext))
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
+        block = ciphertext[offset : offset + BLOCK_SIZE]
+        plain = output[offset : offset + BLOCK_SIZE]
         steps.append(
           {"title": f"Block {idx + 1}", "fields": [{"label": "Cipher", "value": bytes_to_hex(block)}, {"label": "Plain", "value": bytes_to_hex(plain)}]}
         )
     if pad:
         try:
-            output = bytearray(unpad_zero_count(bytes(output), BLOCK_SIZE))
+            output = unpad_zero_count(output, BLOCK_SIZE)
         except ValueError:
             pass
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
 
 
 # CBC encrypt
-def encrypt_cbc(key, plaintext, iv, pad, round_keys, nr):
+def encrypt_cbc(key, plaintext, iv, pad, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
     ensure_block("IV", iv)
+    encrypt, _ = block_funcs(engine, round_keys, nr)
     data = pad_zero_count(plaintext, BLOCK_SIZE) if pad else plaintext
     if not pad and len(data) % BLOCK_SIZE != 0:
         raise ValueError("Input length must align to block size when padding is disabled")
+    n_blocks = block_count(len(data))
+    head, tail = trace_window(n_blocks, trace)
     output = bytearray()
     prev = iv
-    steps = []
+    steps = [] if sink is None else sink
     for idx, block in enumerate(split_blocks(data)):
         mixed = xor_bytes(block, prev)
-        cipher = encrypt_block(mixed, round_keys, nr)
+        cipher = encrypt(mixed)
         output.extend(cipher)
-        steps.append(
-          {"title": f"Block {idx + 1}", "fields": [
-            {"label": "Plain", "value": bytes_to_hex(block)},
-            {"label": "Prev/IV", "value": bytes_to_hex(prev)},
-            {"label": "XOR", "value": bytes_to_hex(mixed)},
-            {"label": "Cipher", "value": bytes_to_hex(cipher)},
-          ]}
-        )
+        if idx < head or idx >= tail:
+            steps.append(
+              {"title": f"Block {idx + 1}", "fields": [
+                {"label": "Plain", "value": bytes_to_hex(block)},
+                {"label": "Prev/IV", "value": bytes_to_hex(prev)},
+                {"label": "XOR", "value": bytes_to_hex(mixed)},
+                {"label": "Cipher", "value": bytes_to_hex(cipher)},
+              ]}
+            )
         prev = cipher
-    return bytes(output), steps
+    return bytes(output), close_trace(steps, n_blocks, trace)
 
 
 # CBC decrypt
-def decrypt_cbc(key, ciphertext, iv, pad, round_keys, nr):
+def decrypt_cbc(key, ciphertext, iv, pad, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
     ensure_block("IV", iv)
+    _, decrypt_blocks = batch_funcs(engine, round_keys, nr)
     if len(ciphertext) % BLOCK_SIZE != 0:
         raise ValueError("Ciphertext length must align to block size")
-    output = bytearray()
-    prev = iv
-    steps = []
-    for idx, block in enumerate(split_blocks(ciphertext)):
-        decrypted = decrypt_block(block, round_keys, nr)
-        plain = xor_bytes(decrypted, prev)
-        output.extend(plain)
+    # every block-cipher input is already known, so decrypt them all at once
+    decrypted_all = decrypt_blocks(ciphertext)
+    prevs = iv + memoryview(ciphertext)[: len(ciphertext) - BLOCK_SIZE] if ciphertext else b""
+    output = xor_bulk(decrypted_all, prevs)
+    n_blocks = block_count(len(ciphertext))
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
         steps.append(
           {"title": f"Block {idx + 1}", "fields": [
-            {"label": "Cipher", "value": bytes_to_hex(block)},
-            {"label": "Prev/IV", "value": bytes_to_hex(prev)},
-            {"label": "Block Dec", "value": bytes_to_hex(decrypted)},
-            {"label": "Plain", "value": bytes_to_hex(plain)},
+            {"label": "Cipher", "value": bytes_to_hex(ciphertext[offset : offset + BLOCK_SIZE])},
+            {"label": "Prev/IV", "value": bytes_to_hex(prevs[offset : offset + BLOCK_SIZE])},
+            {"label": "Block Dec", "value": bytes_to_hex(decrypted_all[offset : offset + BLOCK_SIZE])},
+            {"label": "Plain", "value": bytes_to_hex(output[offset : offset + BLOCK_SIZE])},
           ]}
         )
-        prev = block
     if pad:
         try:
-            output = bytearray(unpad_zero_count(bytes(output), BLOCK_SIZE))
+            output = unpad_zero_count(output, BLOCK_SIZE)
         except ValueError:
             pass
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
 
 
 # CFB encrypt
-def encrypt_cfb(key, plaintext, iv, round_keys, nr):
+def encrypt_cfb(key, plaintext, iv, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
     ensure_block("IV", iv)
+    encrypt, _ = block_funcs(engine, round_keys, nr)
+    n_blocks = block_count(len(plaintext))
+    head, tail = trace_window(n_blocks, trace)
     output = bytearray()
     feedback = iv
-    steps = []
-    for idx, offset in enumerate(range(0, len(plaintext), BLOCK_SIZE)):
-        block = plaintext[offset : offset + BLOCK_SIZE]
-        keystream = encrypt_block(feedback, round_keys, nr)
-        cipher = xor_bytes(block, keystream[: len(block)])
+    steps = [] if sink is None else sink
+    for idx, block in enumerate(split_blocks(plaintext)):
+        keystream = encrypt(feedback)
+        cipher = xor_bytes(block, keystream)
         output.extend(cipher)
-        steps.append(
-          {"title": f"Chunk {idx + 1}", "fields": [
-            {"label": "Plain", "value": bytes_to_hex(block)},
-            {"label": "Keystream", "value": bytes_to_hex(keystream)},
-            {"label": "Cipher", "value": bytes_to_hex(cipher)},
-          ]}
-        )
+        if idx < head or idx >= tail:
+            steps.append(
+              {"title": f"Chunk {idx + 1}", "fields": [
+                {"label": "Plain", "value": bytes_to_hex(block)},
+                {"label": "Keystream", "value": bytes_to_hex(keystream)},
+                {"label": "Cipher", "value": bytes_to_hex(cipher)},
+              ]}
+            )
         if len(cipher) == BLOCK_SIZE:
             feedback = cipher
-    return bytes(output), steps
+    return bytes(output), close_trace(steps, n_blocks, trace)
 
 
 # CFB decrypt
-def decrypt_cfb(key, ciphertext, iv, round_keys, nr):
+def decrypt_cfb(key, ciphertext, iv, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
     ensure_block("IV", iv)
-    output = bytearray()
-    feedback = iv
-    steps = []
-    for idx, offset in enumerate(range(0, len(ciphertext), BLOCK_SIZE)):
-        block = ciphertext[offset : offset + BLOCK_SIZE]
-        keystream = encrypt_block(feedback, round_keys, nr)
-        plain = xor_bytes(block, keystream[: len(block)])
-        output.extend(plain)
+    encrypt_blocks, _ = batch_funcs(engine, round_keys, nr)
+    # feedback for chunk i is cipher chunk i-1, so all keystream inputs are known up front
+    n_blocks = block_count(len(ciphertext))
+    feedbacks = iv + memoryview(ciphertext)[: (n_blocks - 1) * BLOCK_SIZE] if ciphertext else b""
+    keystreams = encrypt_blocks(feedbacks)
+    output = xor_bulk(ciphertext, memoryview(keystreams)[: len(ciphertext)])
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
         steps.append(
           {"title": f"Chunk {idx + 1}", "fields": [
-            {"label": "Cipher", "value": bytes_to_hex(block)},
-            {"label": "Keystream", "value": bytes_to_hex(keystream)},
-            {"label": "Plain", "value": bytes_to_hex(plain)},
+            {"label": "Cipher", "value": bytes_to_hex(ciphertext[offset : offset + BLOCK_SIZE])},
+            {"label": "Keystream", "value": bytes_to_hex(keystreams[offset : offset + BLOCK_SIZE])},
+            {"label": "Plain", "value": bytes_to_hex(output[offset : offset + BLOCK_SIZE])},
           ]}
         )
-        feedback = block
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
+
+
+# OFB keystream blocks following `prefix` (the IV is the feedback when prefix is empty)
+def ofb_keystream(iv, prefix, n_blocks, round_keys, nr, engine=DEFAULT_ENGINE):
+    encrypt, _ = block_funcs(engine, round_keys, nr)
+    keystreams = bytearray()
+    feedback = bytes(prefix[-BLOCK_SIZE:]) if prefix else iv
+    for _ in range(n_blocks):
+        feedback = encrypt(feedback)
+        keystreams += feedback
+    return keystreams
 
 
 # OFB encrypt
-def encrypt_ofb(key, plaintext, iv, round_keys, nr):
+def encrypt_ofb(key, plaintext, iv, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None, cache=None):
     ensure_block("IV", iv)
-    output = bytearray()
-    feedback = iv
-    steps = []
-    for idx, offset in enumerate(range(0, len(plaintext), BLOCK_SIZE)):
-        keystream = encrypt_block(feedback, round_keys, nr)
-        block = plaintext[offset : offset + BLOCK_SIZE]
-        cipher = xor_bytes(block, keystream[: len(block)])
-        output.extend(cipher)
+    n_blocks = block_count(len(plaintext))
+    # the keystream chain is serial, but it never touches the data, so XOR once at the end
+    if cache is None:
+        keystreams = ofb_keystream(iv, b"", n_blocks, round_keys, nr, engine)
+    else:
+        build = lambda prefix, n: ofb_keystream(iv, prefix, n, round_keys, nr, engine)
+        keystreams = cache.keystream(key, "OFB", iv, n_blocks, build)
+    output = xor_bulk(plaintext, memoryview(keystreams)[: len(plaintext)])
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
         steps.append(
           {"title": f"Chunk {idx + 1}", "fields": [
-            {"label": "Plain", "value": bytes_to_hex(block)},
-            {"label": "Keystream", "value": bytes_to_hex(keystream)},
-            {"label": "Cipher", "value": bytes_to_hex(cipher)},
+            {"label": "Plain", "value": bytes_to_hex(plaintext[offset : offset + BLOCK_SIZE])},
+            {"label": "Keystream", "value": bytes_to_hex(keystreams[offset : offset + BLOCK_SIZE])},
+            {"label": "Cipher", "value": bytes_to_hex(output[offset : offset + BLOCK_SIZE])},
           ]}
         )
-        feedback = keystream
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
 
 
 # OFB decrypt (same as encrypt), I had already written the code with decrypt sorry 
-def decrypt_ofb(key, ciphertext, iv, round_keys, nr):
-    return encrypt_ofb(key, ciphertext, iv, round_keys, nr)
+def decrypt_ofb(key, ciphertext, iv, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None, cache=None):
+    return encrypt_ofb(key, ciphertext, iv, round_keys, nr, engine, trace, sink, cache)
+
+
+# CTR counter block = nonce || counter field; the field is the low `width` bits
+COUNTER_WIDTHS = (32, 64, 128)
+
+
+# check a counter width setting
+def ensure_counter_width(width):
+    if width not in COUNTER_WIDTHS:
+        raise ValueError(f"Counter width must be one of: {', '.join(str(w) for w in COUNTER_WIDTHS)} bits")
+
+
+# counter blocks left before the counter field runs out, including this one
+def counter_room(counter, width=128):
+    ensure_counter_width(width)
+    return (1 << width) - (int.from_bytes(counter, "big") & ((1 << width) - 1))
+
+
+# counter + n blocks; the nonce bits above the field never change
+def advance_counter(counter, blocks, width=128):
+    if blocks >= counter_room(counter, width):
+        raise ValueError(f"Counter overflow: the {width}-bit counter field is exhausted")
+    return (int.from_bytes(counter, "big") + blocks).to_bytes(BLOCK_SIZE, "big")
 
 
 # increment counter bytes
-def increment_counter(counter):
-    counter_list = list(counter)
-    for i in range(len(counter_list) - 1, -1, -1):
-        counter_list[i] = (counter_list[i] + 1) & 0xFF
-        if counter_list[i] != 0:
-            break
-    return bytes(counter_list)
+def increment_counter(counter, width=128):
+    return advance_counter(counter, 1, width)
+
+
+# n consecutive counter blocks as one contiguous buffer, built from integer arithmetic
+def counter_blocks(counter, n_blocks, width=128):
+    if n_blocks > counter_room(counter, width):
+        raise ValueError(f"Counter overflow: {n_blocks} blocks do not fit in the {width}-bit counter field")
+    value = int.from_bytes(counter, "big")
+    if np is None:
+        return b"".join((value + i).to_bytes(BLOCK_SIZE, "big") for i in range(n_blocks))
+    # 128-bit add on two u64 halves; the room check above keeps carries inside the field
+    lo_start = np.uint64(value & 0xFFFFFFFFFFFFFFFF)
+    lo = np.arange(n_blocks, dtype=np.uint64) + lo_start
+    words = np.empty((n_blocks, 2), dtype=">u8")
+    words[:, 0] = np.uint64(value >> 64) + (lo < lo_start)
+    words[:, 1] = lo
+    return words.tobytes()
+
+
+# CTR keystream blocks following `prefix`; counter blocks are independent, so it is one batch
+def ctr_keystream(counter, prefix, n_blocks, round_keys, nr, engine=DEFAULT_ENGINE, counter_width=128):
+    encrypt_blocks, _ = batch_funcs(engine, round_keys, nr)
+    skip = len(prefix) // BLOCK_SIZE
+    start = advance_counter(counter, skip, counter_width) if skip else counter
+    return encrypt_blocks(counter_blocks(start, n_blocks, counter_width))
 
 
 # CTR encrypt
-def encrypt_ctr(key, plaintext, counter, round_keys, nr):
+def encrypt_ctr(key, plaintext, counter, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None, counter_width=128, cache=None):
     ensure_block("Counter", counter)
-    output = bytearray()
-    current = counter
-    steps = []
-    for idx, offset in enumerate(range(0, len(plaintext), BLOCK_SIZE)):
-        keystream = encrypt_block(current, round_keys, nr)
-        block = plaintext[offset : offset + BLOCK_SIZE]
-        cipher = xor_bytes(block, keystream[: len(block)])
-        output.extend(cipher)
+    n_blocks = block_count(len(plaintext))
+    if cache is None:
+        keystreams = ctr_keystream(counter, b"", n_blocks, round_keys, nr, engine, counter_width)
+    else:
+        build = lambda prefix, n: ctr_keystream(counter, prefix, n, round_keys, nr, engine, counter_width)
+        keystreams = cache.keystream(key, "CTR", counter, n_blocks, build, counter_width)
+    output = xor_bulk(plaintext, memoryview(keystreams)[: len(plaintext)])
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
         steps.append(
           {"title": f"Chunk {idx + 1}", "fields": [
-            {"label": "Counter", "value": bytes_to_hex(current)},
-            {"label": "Keystream", "value": bytes_to_hex(keystream)},
-            {"label": "Output", "value": bytes_to_hex(cipher)},
+            {"label": "Counter", "value": bytes_to_hex(advance_counter(counter, idx, counter_width))},
+            {"label": "Keystream", "value": bytes_to_hex(keystreams[offset : offset + BLOCK_SIZE])},
+            {"label": "Output", "value": bytes_to_hex(output[offset : offset + BLOCK_SIZE])},
           ]}
         )
-        current = increment_counter(current)
-    return bytes(output), steps
+    return output, close_trace(steps, n_blocks, trace)
 
 
 # CTR decrypt (same as encrypt)
-def decrypt_ctr(key, ciphertext, counter, round_keys, nr):
-    return encrypt_ctr(key, ciphertext, counter, round_keys, nr)
+def decrypt_ctr(key, ciphertext, counter, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None, counter_width=128, cache=None):
+    return encrypt_ctr(key, ciphertext, counter, round_keys, nr, engine, trace, sink, counter_width, cache)
+
+
+# CTR over `data` found at byte `offset` of the stream, without the bytes before it: the counter of the
+# block holding offset is computed, not walked to, and its keystream is used from offset % 16 on
+def encrypt_ctr_range(key, data, counter, offset, round_keys, nr, engine=DEFAULT_ENGINE, trace="none", sink=None, counter_width=128):
+    ensure_block("Counter", counter)
+    if offset < 0:
+        raise ValueError("offset must be non-negative")
+    first, skip = divmod(offset, BLOCK_SIZE)
+    n_blocks = block_count(skip + len(data)) if len(data) else 0
+    start_counter = advance_counter(counter, first, counter_width) if first else counter
+    keystreams = ctr_keystream(start_counter, b"", n_blocks, round_keys, nr, engine, counter_width)
+    output = xor_bulk(data, memoryview(keystreams)[skip : skip + len(data)])
+    steps = [] if sink is None else sink
+    for idx in traced_blocks(n_blocks, trace):
+        start = idx * BLOCK_SIZE
+        steps.append(
+          {"title": f"Chunk {first + idx + 1}", "fields": [
+            {"label": "Counter", "value": bytes_to_hex(advance_counter(start_counter, idx, counter_width))},
+            {"label": "Keystream", "value": bytes_to_hex(keystreams[start : start + BLOCK_SIZE])},
+            {"label": "Output", "value": bytes_to_hex(output[max(0, start - skip) : start + BLOCK_SIZE - skip])},
+          ]}
+        )
+    return output, close_trace(steps, n_blocks, trace)
+
+
+# CTR range decrypt (same as encrypt)
+def decrypt_ctr_range(key, ciphertext, counter, offset, round_keys, nr, engine=DEFAULT_ENGINE, trace="none", sink=None, counter_width=128):
+    return encrypt_ctr_range(key, ciphertext, counter, offset, round_keys, nr, engine, trace, sink, counter_width)
+
+
+# GCM (NIST SP 800-38D): CTR with a 32-bit counter field, authenticated by GHASH over the AAD and ciphertext
+GCM_TAG_LENGTHS = (16, 15, 14, 13, 12, 8, 4)
+GCM_NONCE_SIZE = 12
+GCM_MAX_BLOCKS = (1 << 32) - 2
+GHASH_R = 0xE1 << 120
+
+
+# GHASH tables for H = E(K, 0^128): tables[j][b] is byte b at block position j times H,
+# so a multiply is 16 lookups instead of 128 shift/xor steps (Shoup's 8-bit method, 4096 entries per key)
+def ghash_tables(round_keys, nr):
+    h = int.from_bytes(encrypt_block(bytes(BLOCK_SIZE), round_keys, nr), "big")
+    tables = []
+    for _ in range(BLOCK_SIZE):
+        table = [0] * 256
+        # single bits first: bit 0x80 of byte j is x^(8j), and each later bit is one more multiply by x
+        bit = 0x80
+        while bit:
+            table[bit] = h
+            h = (h >> 1) ^ GHASH_R if h & 1 else h >> 1
+            bit >>= 1
+        for value in range(3, 256):
+            low = value & -value
+            if value != low:
+                table[value] = table[value ^ low] ^ table[low]
+        tables.append(table)
+    return tables
+
+
+# x * H in GF(2^128) for a 128-bit integer x, as a closure over the key's tables
+def ghash_multiplier(tables):
+    t0, t1, t2, t3, t4, t5, t6, t7, t8, t9, t10, t11, t12, t13, t14, t15 = tables
+
+    def mul(x):
+        b = x.to_bytes(BLOCK_SIZE, "big")
+        return (
+            t0[b[0]] ^ t1[b[1]] ^ t2[b[2]] ^ t3[b[3]] ^ t4[b[4]] ^ t5[b[5]] ^ t6[b[6]] ^ t7[b[7]]
+            ^ t8[b[8]] ^ t9[b[9]] ^ t10[b[10]] ^ t11[b[11]] ^ t12[b[12]] ^ t13[b[13]] ^ t14[b[14]] ^ t15[b[15]]
+        )
+
+    return mul
+
+
+# GHASH over data (last block zero-padded), continuing from y
+def ghash_update(mul, y, data):
+    view = memoryview(data)
+    for offset in range(0, len(view), BLOCK_SIZE):
+        block = view[offset : offset + BLOCK_SIZE]
+        y = mul(y ^ int.from_bytes(block, "big") << (BLOCK_SIZE - len(block)) * 8)
+    return y
+
+
+# pre-counter block: nonce || 1 for 96-bit nonces, GHASH of the nonce otherwise
+def gcm_j0(mul, iv):
+    if len(iv) == GCM_NONCE_SIZE:
+        return bytes(iv) + b"\x00\x00\x00\x01"
+    return mul(ghash_update(mul, 0, iv) ^ len(iv) * 8).to_bytes(BLOCK_SIZE, "big")
+
+
+# counter block idx + 1 after j0; only the low 32 bits count, wrapping as inc32 does
+def gcm_counter(j0, idx):
+    value = int.from_bytes(j0, "big")
+    return (value >> 32 << 32 | (value + idx + 1) & 0xFFFFFFFF).to_bytes(BLOCK_SIZE, "big")
+
+
+# E(K, j0) (the tag mask) followed by the keystream from inc32(j0), in one batch;
+# a wrap of the 32-bit field splits the counter run in two
+def gcm_keystream(j0, n_blocks, round_keys, nr, engine=DEFAULT_ENGINE):
+    encrypt_blocks, _ = batch_funcs(engine, round_keys, nr)
+    first = gcm_counter(j0, 0)
+    run = min(n_blocks, counter_room(first, 32))
+    counters = j0 + counter_blocks(first, run, 32)
+    if run < n_blocks:
+        counters += counter_blocks(bytes(j0[:12]) + bytes(4), n_blocks - run, 32)
+    return encrypt_blocks(counters)
+
+
+def ensure_tag_length(tag_length, allowed):
+    if tag_length not in allowed:
+        raise ValueError(f"Tag length must be one of: {', '.join(str(n) for n in allowed)} bytes")
+
+
+# CTR and GHASH in one loop over the data; returns (output, full 16-byte tag)
+def gcm_crypt(data, iv, aad, decrypting, round_keys, nr, engine, trace, steps):
+    if not iv:
+        raise ValueError("GCM nonce must not be empty")
+    n_blocks = block_count(len(data))
+    if n_blocks > GCM_MAX_BLOCKS:
+        raise ValueError("GCM input is limited to 2^32 - 2 blocks")
+    mul = ghash_multiplier(KEY_CACHE.tables("ghash", round_keys, nr))
+    j0 = gcm_j0(mul, iv)
+    stream = memoryview(gcm_keystream(j0, n_blocks, round_keys, nr, engine))
+    mask, keystreams = stream[:BLOCK_SIZE], stream[BLOCK_SIZE:]
+    view = memoryview(data)
+    head, tail = trace_window(n_blocks, trace)
+    y = ghash_update(mul, 0, aad)
+    output = bytearray()
+    for idx in range(n_blocks):
+        offset = idx * BLOCK_SIZE
+        block = view[offset : offset + BLOCK_SIZE]
+        size = len(block)
+        value = int.from_bytes(block, "big")
+        result = value ^ int.from_bytes(keystreams[offset : offset + size], "big")
+        # GHASH always runs over the ciphertext side
+        y = mul(y ^ (value if decrypting else result) << (BLOCK_SIZE - size) * 8)
+        output += result.to_bytes(size, "big")
+        if idx < head or idx >= tail:
+            steps.append(
+              {"title": f"Block {idx + 1}", "fields": [
+                {"label": "Counter", "value": bytes_to_hex(gcm_counter(j0, idx))},
+                {"label": "Keystream", "value": bytes_to_hex(keystreams[offset : offset + size])},
+                {"label": "Cipher" if decrypting else "Plain", "value": bytes_to_hex(block)},
+                {"label": "Plain" if decrypting else "Cipher", "value": bytes_to_hex(output[offset:])},
+                {"label": "GHASH", "value": f"{y:032x}"},
+              ]}
+            )
+    y = mul(y ^ (len(aad) * 8) << 64 ^ len(data) * 8)
+    tag = (int.from_bytes(mask, "big") ^ y).to_bytes(BLOCK_SIZE, "big")
+    if trace != "none":
+        steps.append(
+          {"title": "Tag", "fields": [
+            {"label": "J0", "value": bytes_to_hex(j0)},
+            {"label": "GHASH", "value": f"{y:032x}"},
+            {"label": "E(K, J0)", "value": bytes_to_hex(mask)},
+            {"label": "Tag", "value": bytes_to_hex(tag)},
+          ]}
+        )
+    return bytes(output), tag
+
+
+# GCM encrypt: output is ciphertext || tag
+def encrypt_gcm(key, plaintext, iv, aad, tag_length, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    ensure_tag_length(tag_length, GCM_TAG_LENGTHS)
+    steps = [] if sink is None else sink
+    output, tag = gcm_crypt(plaintext, iv, aad, False, round_keys, nr, engine, trace, steps)
+    return output + tag[:tag_length], close_trace(steps, block_count(len(plaintext)), trace)
+
+
+# GCM decrypt: input is ciphertext || tag; nothing is returned unless the tag matches
+def decrypt_gcm(key, data, iv, aad, tag_length, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    ensure_tag_length(tag_length, GCM_TAG_LENGTHS)
+    if len(data) < tag_length:
+        raise ValueError(f"GCM input must end with the {tag_length}-byte tag")
+    ciphertext = memoryview(data)[: len(data) - tag_length]
+    steps = [] if sink is None else sink
+    output, tag = gcm_crypt(ciphertext, iv, aad, True, round_keys, nr, engine, trace, steps)
+    if not hmac.compare_digest(tag[:tag_length], bytes(data[len(data) - tag_length :])):
+        raise ValueError("GCM authentication failed: tag mismatch")
+    return output, close_trace(steps, block_count(len(ciphertext)), trace)
+
+
+# CCM (NIST SP 800-38C / RFC 3610): CBC-MAC over B0, the AAD and the plaintext, CTR for the payload and the tag
+CCM_TAG_LENGTHS = (16, 14, 12, 10, 8, 6, 4)
+CCM_NONCE_SIZES = range(7, 14)
+
+
+# B0 (flags || nonce || message length) and counter block 0 (flags || nonce || 0); the length field takes
+# the 15 - len(nonce) bytes the nonce leaves free
+def ccm_blocks(iv, aad, tag_length, length):
+    if len(iv) not in CCM_NONCE_SIZES:
+        raise ValueError("CCM nonce must be 7 to 13 bytes")
+    q = BLOCK_SIZE - 1 - len(iv)
+    if length >> 8 * q:
+        raise ValueError(f"CCM input is limited to 2^{8 * q} - 1 bytes with a {len(iv)}-byte nonce")
+    flags = (0x40 if aad else 0) | (tag_length - 2) // 2 << 3 | q - 1
+    return bytes([flags]) + bytes(iv) + length.to_bytes(q, "big"), bytes([q - 1]) + bytes(iv) + bytes(q)
+
+
+# AAD with its length prefix (2, 6 or 10 bytes by size), zero-padded to whole blocks; empty without AAD
+def ccm_aad(aad):
+    if not aad:
+        return b""
+    size = len(aad)
+    if size < 0xFF00:
+        prefix = size.to_bytes(2, "big")
+    elif size >> 32 == 0:
+        prefix = b"\xff\xfe" + size.to_bytes(4, "big")
+    else:
+        prefix = b"\xff\xff" + size.to_bytes(8, "big")
+    encoded = prefix + bytes(aad)
+    return encoded + bytes(-len(encoded) % BLOCK_SIZE)
+
+
+# CBC-MAC and CTR in one loop over the data: each block feeds the MAC chain on the plaintext side and is
+# xored with its keystream block, so the CBC ciphertext is never built; returns (output, full 16-byte tag)
+def ccm_crypt(data, iv, aad, tag_length, decrypting, round_keys, nr, engine, trace, steps):
+    b0, ctr0 = ccm_blocks(iv, aad, tag_length, len(data))
+    n_blocks = block_count(len(data))
+    encrypt_blocks, _ = batch_funcs(engine, round_keys, nr)
+    # the MAC chain is serial, so it always takes the one-block function
+    mac, _ = block_funcs(engine, round_keys, nr)
+    # E(K, Ctr0) masks the tag; the payload keystream starts at Ctr1, all in one batch
+    stream = memoryview(encrypt_blocks(ctr0 + counter_blocks(advance_counter(ctr0, 1), n_blocks)))
+    mask, keystreams = stream[:BLOCK_SIZE], stream[BLOCK_SIZE:]
+    y = mac(b0)
+    header = ccm_aad(aad)
+    for offset in range(0, len(header), BLOCK_SIZE):
+        y = mac(xor_bulk(y, header[offset : offset + BLOCK_SIZE]))
+    view = memoryview(data)
+    head, tail = trace_window(n_blocks, trace)
+    output = bytearray()
+    for idx in range(n_blocks):
+        offset = idx * BLOCK_SIZE
+        block = view[offset : offset + BLOCK_SIZE]
+        size = len(block)
+        value = int.from_bytes(block, "big")
+        result = value ^ int.from_bytes(keystreams[offset : offset + size], "big")
+        # the MAC always runs over the plaintext side, zero-padded
+        plain = result if decrypting else value
+        y = mac((int.from_bytes(y, "big") ^ plain << (BLOCK_SIZE - size) * 8).to_bytes(BLOCK_SIZE, "big"))
+        output += result.to_bytes(size, "big")
+        if idx < head or idx >= tail:
+            steps.append(
+              {"title": f"Block {idx + 1}", "fields": [
+                {"label": "Counter", "value": bytes_to_hex(advance_counter(ctr0, idx + 1))},
+                {"label": "Keystream", "value": bytes_to_hex(keystreams[offset : offset + size])},
+                {"label": "Cipher" if decrypting else "Plain", "value": bytes_to_hex(block)},
+                {"label": "Plain" if decrypting else "Cipher", "value": bytes_to_hex(output[offset:])},
+                {"label": "CBC-MAC", "value": bytes_to_hex(y)},
+              ]}
+            )
+    tag = xor_bulk(y, mask)
+    if trace != "none":
+        steps.append(
+          {"title": "Tag", "fields": [
+            {"label": "B0", "value": bytes_to_hex(b0)},
+            {"label": "CBC-MAC", "value": bytes_to_hex(y)},
+            {"label": "E(K, Ctr0)", "value": bytes_to_hex(mask)},
+            {"label": "Tag", "value": bytes_to_hex(tag[:tag_length])},
+          ]}
+        )
+    return bytes(output), tag
+
+
+# CCM encrypt: output is ciphertext || tag
+def encrypt_ccm(key, plaintext, iv, aad, tag_length, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    ensure_tag_length(tag_length, CCM_TAG_LENGTHS)
+    steps = [] if sink is None else sink
+    output, tag = ccm_crypt(plaintext, iv, aad, tag_length, False, round_keys, nr, engine, trace, steps)
+    return output + tag[:tag_length], close_trace(steps, block_count(len(plaintext)), trace)
+
+
+# CCM decrypt: input is ciphertext || tag; nothing is returned unless the tag matches
+def decrypt_ccm(key, data, iv, aad, tag_length, round_keys, nr, engine=DEFAULT_ENGINE, trace="full", sink=None):
+    ensure_tag_length(tag_length, CCM_TAG_LENGTHS)
+    if len(data) < tag_length:
+        raise ValueError(f"CCM input must end with the {tag_length}-byte tag")
+    ciphertext = memoryview(data)[: len(data) - tag_length]
+    steps = [] if sink is None else sink
+    output, tag = ccm_crypt(ciphertext, iv, aad, tag_length, True, round_keys, nr, engine, trace, steps)
+    if not hmac.compare_digest(tag[:tag_length], bytes(data[len(data) - tag_length :])):
+        raise ValueError("CCM authentication failed: tag mismatch")
+    return output, close_trace(steps, block_count(len(ciphertext)), trace)
+
+
+# XTS (IEEE 1619 / SP 800-38E): each sector is encrypted on its own under a tweak derived from its number,
+# so sectors can be read, rewritten and processed in any order
+XTS_KEY_SIZES = (32, 64)
+XTS_SECTOR_SIZE = 512
+XTS_CHUNK_SECTORS = 256
+XTS_GF_REDUCE = 0x87
+XTS_TWEAK_MASK = (1 << 128) - 1
+XTS_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="cipher-xts")
+
+
+# data key || tweak key from hex, each AES-128 or AES-256
+def parse_xts_key(key_hex):
+    key = hex_to_bytes(key_hex)
+    if len(key) not in XTS_KEY_SIZES:
+        raise ValueError("XTS key must be 256 or 512 bits (32/64 bytes hex: data key, then tweak key)")
+    half = len(key) // 2
+    if hmac.compare_digest(key[:half], key[half:]):
+        raise ValueError("XTS data and tweak keys must differ")
+    return key[:half], key[half:]
+
+
+# (data, tweak) schedules for an XTS key, each as (nr, round_keys), through the key cache
+def xts_schedules(key_hex):
+    data_key, tweak_key = parse_xts_key(key_hex)
+    _, nr, round_keys = KEY_CACHE.expand(data_key)
+    _, tweak_nr, tweak_round_keys = KEY_CACHE.expand(tweak_key)
+    return (nr, round_keys), (tweak_nr, tweak_round_keys)
+
+
+# sector number and sector size (bytes) from request values
+def parse_sectors(sector, sector_size):
+    try:
+        sector = int(sector)
+        sector_size = int(sector_size)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("sector and sectorSize must be integers") from exc
+    if not 0 <= sector <= XTS_TWEAK_MASK:
+        raise ValueError("sector must be between 0 and 2^128 - 1")
+    if sector_size < BLOCK_SIZE or sector_size % BLOCK_SIZE:
+        raise ValueError(f"sectorSize must be a positive multiple of {BLOCK_SIZE} bytes")
+    return sector, sector_size
+
+
+# per-block tweaks for n_sectors sectors from `sector`, sector-major like the data: E(K2, sector) for every
+# sector is one batch, then the multiply-by-alpha chain steps all sectors at once (numpy) or one by one
+def xts_tweaks(sector, n_sectors, blocks_per_sector, tweak_round_keys, tweak_nr, engine=DEFAULT_ENGINE):
+    encrypt_blocks, _ = batch_funcs(engine, tweak_round_keys, tweak_nr)
+    base = encrypt_blocks(b"".join((sector + i).to_bytes(BLOCK_SIZE, "little") for i in range(n_sectors)))
+    if np is not None:
+        words = np.frombuffer(base, dtype="<u8").reshape(n_sectors, 2)
+        lo = words[:, 0].copy()
+        hi = words[:, 1].copy()
+        tweaks = np.empty((n_sectors, blocks_per_sector, 2), dtype="<u8")
+        one, top = np.uint64(1), np.uint64(63)
+        for j in range(blocks_per_sector):
+            tweaks[:, j, 0] = lo
+            tweaks[:, j, 1] = hi
+            carry = hi >> top
+            hi = (hi << one) | (lo >> top)
+            lo = (lo << one) ^ (carry * np.uint64(XTS_GF_REDUCE))
+        return tweaks.tobytes()
+    tweaks = bytearray()
+    for offset in range(0, len(base), BLOCK_SIZE):
+        t = int.from_bytes(base[offset : offset + BLOCK_SIZE], "little")
+        for _ in range(blocks_per_sector):
+            tweaks += t.to_bytes(BLOCK_SIZE, "little")
+            t = (t << 1 ^ XTS_GF_REDUCE) & XTS_TWEAK_MASK if t >> 127 else t << 1
+    return bytes(tweaks)
+
+
+# XTS over whole sectors from `sector` (only the last may be short); returns (output, tweaks)
+def xts_chunk(data, sector, sector_size, encrypting, round_keys, nr, tweak_round_keys, tweak_nr, engine=DEFAULT_ENGINE):
+    encrypt_blocks, decrypt_blocks = batch_funcs(engine, round_keys, nr)
+    crypt = encrypt_blocks if encrypting else decrypt_blocks
+    n_sectors = -(-len(data) // sector_size)
+    tweaks = xts_tweaks(sector, n_sectors, sector_size // BLOCK_SIZE, tweak_round_keys, tweak_nr, engine)
+    tweaks = memoryview(tweaks)[: block_count(len(data)) * BLOCK_SIZE]
+    view = memoryview(data)
+    full = len(data) - len(data) % BLOCK_SIZE
+    # every whole block is independent: xor tweak, one batch through the cipher, xor tweak
+    output = bytearray(xor_bulk(crypt(xor_bulk(view[:full], tweaks[:full])), tweaks[:full]))
+    tail = len(data) - full
+    if tail:
+        # ciphertext stealing: the last whole block and the partial one trade places and tweaks
+        last = full - BLOCK_SIZE
+        step = lambda block, tweak: xor_bulk(crypt(xor_bulk(block, tweak)), tweak)
+        if encrypting:
+            stolen = bytes(output[last:])
+            output[last:] = step(bytes(view[full:]) + stolen[tail:], tweaks[full:]) + stolen[:tail]
+        else:
+            stolen = step(view[last:full], tweaks[full:])
+            output[last:] = step(bytes(view[full:]) + stolen[tail:], tweaks[last:full]) + stolen[:tail]
+    return bytes(output), tweaks
+
+
+# XTS over data starting at `sector`; runs of XTS_CHUNK_SECTORS sectors go to the pool when the engine
+# releases the GIL (numpy), pure-Python engines would only take turns on it
+def xts_crypt(data, sector, sector_size, encrypting, round_keys, nr, tweak_round_keys, tweak_nr, engine, trace, steps, pool):
+    if not data:
+        return b""
+    last_sector = len(data) % sector_size
+    if 0 < last_sector < BLOCK_SIZE:
+        raise ValueError(f"XTS needs at least {BLOCK_SIZE} bytes in the last sector")
+    if sector + -(-len(data) // sector_size) - 1 > XTS_TWEAK_MASK:
+        raise ValueError("XTS sector numbers must stay below 2^128")
+    view = memoryview(data)
+    chunk = XTS_CHUNK_SECTORS * sector_size
+    args = (sector_size, encrypting, round_keys, nr, tweak_round_keys, tweak_nr, engine)
+    if engine == "numpy" and len(data) > chunk:
+        futures = [
+            pool.submit(xts_chunk, view[offset : offset + chunk], sector + offset // sector_size, *args)
+            for offset in range(0, len(data), chunk)
+        ]
+        parts = [future.result() for future in futures]
+    else:
+        parts = [xts_chunk(view, sector, *args)]
+    output = b"".join(part for part, _ in parts)
+    n_blocks = block_count(len(data))
+    per_sector = sector_size // BLOCK_SIZE
+    tweaks = b"".join(tweak for _, tweak in parts) if trace != "none" else b""
+    for idx in traced_blocks(n_blocks, trace):
+        offset = idx * BLOCK_SIZE
+        steps.append(
+          {"title": f"Block {idx + 1}", "fields": [
+            {"label": "Sector", "value": str(sector + idx // per_sector)},
+            {"label": "Tweak", "value": bytes_to_hex(tweaks[offset : offset + BLOCK_SIZE])},
+            {"label": "Plain" if encrypting else "Cipher", "value": bytes_to_hex(view[offset : offset + BLOCK_SIZE])},
+            {"label": "Cipher" if encrypting else "Plain", "value": bytes_to_hex(output[offset : offset + BLOCK_SIZE])},
+          ]}
+        )
+    return output
+
+
+# XTS encrypt; the same sector and data always give the same output, one sector costs one sector of work
+def encrypt_xts(key, plaintext, sector, sector_size, round_keys, nr, tweak_round_keys, tweak_nr, engine=DEFAULT_ENGINE, trace="full", sink=None, pool=XTS_POOL):
+    steps = [] if sink is None else sink
+    output = xts_crypt(plaintext, sector, sector_size, True, round_keys, nr, tweak_round_keys, tweak_nr, engine, trace, steps, pool)
+    return output, close_trace(steps, block_count(len(plaintext)), trace)
+
+
+# XTS decrypt
+def decrypt_xts(key, ciphertext, sector, sector_size, round_keys, nr, tweak_round_keys, tweak_nr, engine=DEFAULT_ENGINE, trace="full", sink=None, pool=XTS_POOL):
+    steps = [] if sink is None else sink
+    output = xts_crypt(ciphertext, sector, sector_size, False, round_keys, nr, tweak_round_keys, tweak_nr, engine, trace, steps, pool)
+    return output, close_trace(steps, block_count(len(ciphertext)), trace)
+
+
+API_TRACE_LEVELS = TRACE_LEVELS + ("stored",)
+TRACE_PAGE_LIMIT = 500
+
+
+# collects steps as compact JSON lines instead of dicts
+class TraceRecorder:
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array("Q")
+
+    def append(self, step):
+        self.offsets.append(len(self.blob))
+        self.blob += json.dumps(step, separators=(",", ":")).encode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+# stored traces: newest in memory, older ones spilled to disk, oldest evicted past the size cap
+class TraceStore:
+    def __init__(self, memory_budget=64 << 20, total_budget=1 << 30, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.total_budget = total_budget
+        self.spill_dir = spill_dir
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def recorder(self):
+        return TraceRecorder()
+
+    def commit(self, recorder):
+        trace_id = uuid.uuid4().hex
+        entry = {"blob": bytes(recorder.blob), "offsets": recorder.offsets, "path": None}
+        entry["size"] = len(entry["blob"])
+        entry["offsets"].append(entry["size"])
+        recorder.blob = bytearray()
+        with self._lock:
+            self._traces[trace_id] = entry
+            self.memory_bytes += entry["size"]
+            self._rebalance()
+        return trace_id
+
+    def _rebalance(self):
+        while self._traces and self.memory_bytes + self.disk_bytes > self.total_budget:
+            self._evict(next(iter(self._traces)))
+        for trace_id, entry in self._traces.items():
+            if self.memory_bytes <= self.memory_budget:
+                break
+            if entry["blob"] is not None:
+                self._spill(trace_id, entry)
+
+    def _spill(self, trace_id, entry):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="aes-trace-")
+        path = os.path.join(self.spill_dir, f"{trace_id}.jsonl")
+        with open(path, "wb") as fh:
+            fh.write(entry["blob"])
+        entry["path"] = path
+        entry["blob"] = None
+        self.memory_bytes -= entry["size"]
+        self.disk_bytes += entry["size"]
+
+    def _evict(self, trace_id):
+        entry = self._traces.pop(trace_id)
+        if entry["path"] is None:
+            self.memory_bytes -= entry["size"]
+        else:
+            self.disk_bytes -= entry["size"]
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def page(self, trace_id, offset, limit):
+        with self._lock:
+            entry = self._traces.get(trace_id)
+            if entry is None:
+                return None
+            offsets = entry["offsets"]
+            total = len(offsets) - 1
+            stop = min(offset + limit, total)
+            steps = []
+            if offset < stop:
+                start_byte, end_byte = offsets[offset], offsets[stop]
+                if entry["blob"] is not None:
+                    raw = entry["blob"][start_byte:end_byte]
+                else:
+                    with open(entry["path"], "rb") as fh:
+                        fh.seek(start_byte)
+                        raw = fh.read(end_byte - start_byte)
+                for idx in range(offset, stop):
+                    steps.append(json.loads(raw[offsets[idx] - start_byte : offsets[idx + 1] - start_byte]))
+        return {"id": trace_id, "total": total, "offset": offset, "steps": steps}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "traces": len(self._traces),
+                "memoryBytes": self.memory_bytes,
+                "diskBytes": self.disk_bytes,
+            }
+
+
+TRACE_STORE = TraceStore()
+
+
+# stands in for TRACE_STORE inside a worker process; the parent commits the recorded steps
+class PendingTraces:
+    def __init__(self):
+        self.pending = []
+        self._lock = threading.Lock()
+
+    def recorder(self):
+        return TraceRecorder()
+
+    # the placeholder id is an index into pending, swapped for a real id by commit_pending
+    def commit(self, recorder):
+        with self._lock:
+            self.pending.append(recorder)
+            return len(self.pending) - 1
+
+
+# replace placeholder trace ids in a result with ids from the real trace store
+def commit_pending(result, pending):
+    trace_info = result.get("trace") or {}
+    if "id" in trace_info:
+        trace_info["id"] = TRACE_STORE.commit(pending[trace_info["id"]])
 
 
 # guess encoding for decrypt
@@ -998,6 +2146,28 @@ def detect_encoding(text):
     return None
 
 
+# detect and decode in one go: try the hex and base64 decoders directly, the
+# scanning detect_encoding only runs for text neither decoder accepts as-is
+def detect_and_decode(text):
+    try:
+        data = bytes.fromhex(text)
+        if data:
+            return data, "hex"
+    except ValueError:
+        pass
+    if STRICT_BASE64 and text and len(text) % 4 == 0:
+        try:
+            data = binascii.a2b_base64(text, strict_mode=True)
+            # strict mode still allows extra "=" after a full quad
+            pad = 2 if text.endswith("==") else 1 if text.endswith("=") else 0
+            if len(data) == len(text) // 4 * 3 - pad:
+                return data, "base64"
+        except (ValueError, binascii.Error):
+            pass
+    encoding = detect_encoding(text) or "utf8"
+    return decode_input(text, encoding), encoding
+
+
 # decode input foreach encoding
 def decode_input(text, encoding):
     if encoding == "utf8":
@@ -1009,15 +2179,42 @@ def decode_input(text, encoding):
     raise ValueError("Unknown encoding")
 
 
-# prepare outputs
-def format_outputs(data):
-    # trim trailing nulls for nicer utf8 display
-    clean = data.rstrip(b"\x00")
-    return {
-        "hex": bytes_to_hex(data),
-        "base64": bytes_to_base64(data),
-        "utf8": utf8_to_string(clean),
-    }
+OUTPUT_ENCODINGS = ("hex", "base64", "utf8")
+
+
+# prepare outputs; only the requested encodings are built, the utf8 preview can be capped
+def format_outputs(data, encodings=OUTPUT_ENCODINGS, utf8_limit=None):
+    outputs = {}
+    if "hex" in encodings:
+        outputs["hex"] = bytes_to_hex(data)
+    if "base64" in encodings:
+        outputs["base64"] = bytes_to_base64(data)
+    if "utf8" in encodings:
+        truncated = utf8_limit is not None and len(data) > utf8_limit
+        preview = data[:utf8_limit] if truncated else data
+        # trim trailing nulls for nicer utf8 display
+        outputs["utf8"] = utf8_to_string(preview.rstrip(b"\x00"))
+        if truncated:
+            outputs["utf8Truncated"] = True
+    return outputs
+
+
+# outputEncodings / utf8PreviewLimit from a request payload
+def output_options(payload):
+    encodings = payload.get("outputEncodings", OUTPUT_ENCODINGS)
+    if isinstance(encodings, str):
+        encodings = [name.strip() for name in encodings.split(",") if name.strip()]
+    if not isinstance(encodings, (list, tuple)) or any(name not in OUTPUT_ENCODINGS for name in encodings):
+        raise ValueError(f"outputEncodings must be a list of: {', '.join(OUTPUT_ENCODINGS)}")
+    limit = payload.get("utf8PreviewLimit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("utf8PreviewLimit must be an integer number of bytes") from exc
+        if limit < 0:
+            raise ValueError("utf8PreviewLimit must be non-negative")
+    return tuple(encodings), limit
 
 
 # IV is zero by default 
@@ -1030,44 +2227,432 @@ def default_counter():
     return bytes([0] * BLOCK_SIZE)
 
 
-# main cipher
-def run_cipher(payload):
+# nonce default for the authenticated modes, zeros like the IV
+def default_nonce():
+    return bytes(GCM_NONCE_SIZE)
+
+
+STREAM_MODES = ("ECB", "CBC", "CFB", "OFB", "CTR")
+# authenticated modes take a nonce (ivHex), optional AAD and a tag length; they run on /api/cipher only
+AEAD_MODES = ("GCM", "CCM")
+# sector modes take a double-length key plus sector/sectorSize; also /api/cipher only
+SECTOR_MODES = ("XTS",)
+CIPHER_MODES = STREAM_MODES + AEAD_MODES + SECTOR_MODES
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# read a file-like body in fixed-size chunks until EOF
+def iter_chunks(stream, size=STREAM_CHUNK_SIZE):
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+# read and drop the rest of a request body after an error; werkzeug drains leftover input with a blocking
+# read that waits for the client to close, while the client waits for the response, so both would stall
+def discard_body(stream):
+    try:
+        for _ in iter_chunks(stream):
+            pass
+    except Exception:
+        # the client is gone or sent a broken body; nothing left to wait for
+        pass
+
+
+# run one aligned window (or the final tail) and return the carried mode state; data may be a view
+# into the caller's buffer, so state taken from it is copied
+def stream_step(key, operation, mode, data, state, pad, round_keys, nr, engine, counter_width=128):
+    if mode == "ECB":
+        run = encrypt_ecb if operation == "encrypt" else decrypt_ecb
+        output, _ = run(key, data, pad, round_keys, nr, engine, "none")
+        return output, state
+    if mode == "CBC":
+        if operation == "encrypt":
+            output, _ = encrypt_cbc(key, data, state, pad, round_keys, nr, engine, "none")
+            return output, output[-BLOCK_SIZE:] if output else state
+        output, _ = decrypt_cbc(key, data, state, pad, round_keys, nr, engine, "none")
+        return output, bytes(data[-BLOCK_SIZE:]) if data else state
+    if mode == "CFB":
+        if operation == "encrypt":
+            output, _ = encrypt_cfb(key, data, state, round_keys, nr, engine, "none")
+            return output, output[-BLOCK_SIZE:] if output else state
+        output, _ = decrypt_cfb(key, data, state, round_keys, nr, engine, "none")
+        return output, bytes(data[-BLOCK_SIZE:]) if data else state
+    if mode == "OFB":
+        output, _ = encrypt_ofb(key, data, state, round_keys, nr, engine, "none")
+        # next feedback is the last keystream block, recovered from output ^ input
+        return output, xor_bulk(output[-BLOCK_SIZE:], data[-BLOCK_SIZE:]) if data else state
+    if mode == "CTR":
+        # state None: the last counter value in the field has been used
+        if state is None:
+            if data:
+                raise ValueError(f"Counter overflow: the {counter_width}-bit counter field is exhausted")
+            return b"", None
+        output, _ = encrypt_ctr(key, data, state, round_keys, nr, engine, "none", None, counter_width)
+        n_blocks = block_count(len(data))
+        if n_blocks == counter_room(state, counter_width):
+            return output, None
+        return output, advance_counter(state, n_blocks, counter_width)
+    raise ValueError("Unknown mode")
+
+
+# incremental cipher: update() as data arrives, finalize() once at the end
+class CipherContext:
+    __slots__ = ("key", "operation", "round_keys", "nr", "engine", "state", "buffer", "pad", "finalized")
+    mode = None
+    block_mode = False
+    state_label = "IV"
+
+    def __init__(self, key, operation="encrypt", iv=None, pad=False, engine=DEFAULT_ENGINE):
+        if operation not in ("encrypt", "decrypt"):
+            raise ValueError("operation must be encrypt or decrypt")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine (expected one of: {', '.join(ENGINES)})")
+        self.key = bytes(key)
+        _, self.nr, self.round_keys = KEY_CACHE.expand(self.key)
+        self.operation = operation
+        self.engine = engine
+        self.state = default_iv() if iv is None else bytes(iv)
+        ensure_block(self.state_label, self.state)
+        self.buffer = bytearray()
+        self.pad = bool(pad) and self.block_mode
+        self.finalized = False
+
+    # decrypt with padding keeps the last block back until finalize()
+    def _holdback(self):
+        return BLOCK_SIZE if self.pad and self.operation == "decrypt" else 0
+
+    def _run(self, data, pad):
+        output, self.state = stream_step(
+            self.key, self.operation, self.mode, data, self.state, pad, self.round_keys, self.nr, self.engine
+        )
+        return output
+
+    # outputs for the block-aligned part of buffer + chunk; the bulk runs straight from a view of the chunk,
+    # only a carried partial block is joined up and only the new remainder is copied into the buffer
+    def _feed(self, chunk):
+        if self.finalized:
+            raise ValueError("Cipher context already finalized")
+        view = memoryview(chunk)
+        carried = len(self.buffer)
+        usable = carried + len(view) - self._holdback()
+        usable -= usable % BLOCK_SIZE
+        if usable <= 0:
+            self.buffer += view
+            return []
+        outputs = []
+        head = 0
+        if carried:
+            head = min(usable, carried + -carried % BLOCK_SIZE)
+            if head <= carried:
+                piece = bytes(self.buffer[:head])
+                del self.buffer[:head]
+            else:
+                piece = bytes(self.buffer) + view[: head - carried]
+                del self.buffer[:]
+            outputs.append(self._run(piece, False))
+        start = max(0, head - carried)
+        end = start + usable - head
+        if end > start:
+            outputs.append(self._run(view[start:end], False))
+        self.buffer += view[end:]
+        return outputs
+
+    def update(self, chunk):
+        return b"".join(self._feed(chunk))
+
+    # like update(), but writes into out and returns the byte count
+    def update_into(self, chunk, out):
+        if len(out) < len(self.buffer) + len(chunk):
+            raise ValueError("Output buffer too small (needs buffered + chunk length)")
+        written = 0
+        for output in self._feed(chunk):
+            out[written : written + len(output)] = output
+            written += len(output)
+        return written
+
+    def finalize(self):
+        if self.finalized:
+            raise ValueError("Cipher context already finalized")
+        self.finalized = True
+        tail = bytes(self.buffer)
+        self.buffer = bytearray()
+        if self.block_mode and len(tail) % BLOCK_SIZE != 0 and not (self.pad and self.operation == "encrypt"):
+            raise ValueError("Input length must align to block size for this mode")
+        return self._run(tail, self.pad)
+
+
+class EcbContext(CipherContext):
+    __slots__ = ()
+    mode = "ECB"
+    block_mode = True
+
+
+class CbcContext(CipherContext):
+    __slots__ = ()
+    mode = "CBC"
+    block_mode = True
+
+
+class CfbContext(CipherContext):
+    __slots__ = ()
+    mode = "CFB"
+
+
+class OfbContext(CipherContext):
+    __slots__ = ()
+    mode = "OFB"
+
+
+class CtrContext(CipherContext):
+    __slots__ = ("counter_width",)
+    mode = "CTR"
+    state_label = "Counter"
+
+    def __init__(self, key, operation="encrypt", counter=None, engine=DEFAULT_ENGINE, counter_width=128):
+        ensure_counter_width(counter_width)
+        self.counter_width = counter_width
+        super().__init__(key, operation, default_counter() if counter is None else counter, False, engine)
+
+    def _run(self, data, pad):
+        output, self.state = stream_step(
+            self.key, self.operation, self.mode, data, self.state, pad, self.round_keys, self.nr, self.engine,
+            self.counter_width,
+        )
+        return output
+
+
+CONTEXT_CLASSES = {
+    "ECB": EcbContext,
+    "CBC": CbcContext,
+    "CFB": CfbContext,
+    "OFB": OfbContext,
+    "CTR": CtrContext,
+}
+
+
+# build the context for a mode; iv is the counter for CTR
+def new_context(mode, key, operation="encrypt", iv=None, pad=False, engine=DEFAULT_ENGINE, counter_width=128):
+    if mode not in CONTEXT_CLASSES:
+        raise ValueError(f"Unknown mode (expected one of: {', '.join(CONTEXT_CLASSES)})")
+    if mode == "CTR":
+        return CtrContext(key, operation, iv, engine, counter_width)
+    return CONTEXT_CLASSES[mode](key, operation, iv, pad, engine)
+
+
+# context for stream_params output; block modes always pad on encrypt, same as run_cipher
+def stream_context(operation, mode, key, iv, counter, pad, engine=DEFAULT_ENGINE, counter_width=128):
+    if mode in ("ECB", "CBC") and operation == "encrypt":
+        pad = True
+    return new_context(mode, key, operation, counter if mode == "CTR" else iv, pad, engine, counter_width)
+
+
+# errors a known body length already proves, raised before any output goes out
+def check_stream_length(params, length):
+    if length is None:
+        return
+    if params["mode"] in ("ECB", "CBC") and params["operation"] == "decrypt" and length % BLOCK_SIZE:
+        raise ValueError("Input length must align to block size for this mode")
+    if params["mode"] == "CTR" and block_count(length) > counter_room(params["counter"], params["counter_width"]):
+        raise ValueError(
+            f"Counter overflow: {block_count(length)} blocks do not fit in the {params['counter_width']}-bit counter field"
+        )
+
+
+# streaming cipher: chunks in, chunks out, buffering at most one chunk plus a block
+def stream_cipher(chunks, context):
+    for chunk in chunks:
+        output = context.update(chunk)
+        if output:
+            yield output
+    output = context.finalize()
+    if output:
+        yield output
+
+
+# counter width (bits) from a request value
+def parse_counter_width(value):
+    try:
+        width = int(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Counter width must be an integer number of bits") from exc
+    ensure_counter_width(width)
+    return width
+
+
+# tag length (bytes) from a request value
+def parse_tag_length(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Tag length must be an integer number of bytes") from exc
+
+
+# key bytes from hex, checked for a valid AES size
+def parse_key(key_hex):
+    key = hex_to_bytes(key_hex)
+    if len(key) not in (16, 24, 32):
+        raise ValueError("Key must be 128, 192, or 256 bits (16/24/32 bytes hex)")
+    return key
+
+
+# parse /api/cipher/stream query parameters
+def stream_params(args):
+    operation = args.get("operation", "encrypt")
+    if operation not in ("encrypt", "decrypt"):
+        raise ValueError("operation must be encrypt or decrypt")
+    mode = args.get("mode", "")
+    if mode not in STREAM_MODES:
+        raise ValueError(f"Unknown mode (expected one of: {', '.join(STREAM_MODES)})")
+    engine = args.get("engine", DEFAULT_ENGINE)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine (expected one of: {', '.join(ENGINES)})")
+    key = parse_key(args.get("keyHex", ""))
+    iv_hex = args.get("ivHex", "")
+    counter_hex = args.get("counterHex", "")
+    iv = hex_to_bytes(iv_hex) if iv_hex.strip() else default_iv()
+    counter = hex_to_bytes(counter_hex) if counter_hex.strip() else default_counter()
+    ensure_block("IV", iv)
+    ensure_block("Counter", counter)
+    pad = args.get("padding", "false").lower() in ("1", "true", "yes")
+    counter_width = parse_counter_width(args.get("counterWidth", 128))
+    return {
+        "operation": operation,
+        "mode": mode,
+        "key": key,
+        "iv": iv,
+        "counter": counter,
+        "pad": pad and mode in ("ECB", "CBC"),
+        "engine": engine,
+        "counter_width": counter_width,
+    }
+
+
+# validated cipher parameters from a request payload (everything but the data)
+# schedule is (key, nr, round_keys) when the caller already expanded the key
+def cipher_params(payload, schedule=None, timer=None):
     operation = payload.get("operation")
     mode = payload.get("mode")
-    input_encoding = payload.get("inputEncoding", "utf8")
     padding_flag = bool(payload.get("padding", False))
-    text = payload.get("text", "")
     key_hex = payload.get("keyHex", "")
     iv_hex = payload.get("ivHex", "")
     counter_hex = payload.get("counterHex", "")
+    engine = payload.get("engine", DEFAULT_ENGINE)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine (expected one of: {', '.join(ENGINES)})")
+    trace = payload.get("trace", "full")
+    if trace not in API_TRACE_LEVELS:
+        raise ValueError(f"Unknown trace level (expected one of: {', '.join(API_TRACE_LEVELS)})")
+    range_offset = payload.get("offset")
+    range_length = payload.get("length")
+    counter_width = parse_counter_width(payload.get("counterWidth", 128))
+    aad_hex = payload.get("aadHex", "")
+    tag_length = parse_tag_length(payload.get("tagLength", 16))
+    sector, sector_size = parse_sectors(payload.get("sector", 0), payload.get("sectorSize", XTS_SECTOR_SIZE))
+
+    if timer is not None:
+        timer.mark("params")
+    tweak_schedule = None
+    if mode in SECTOR_MODES:
+        # XTS keys are two AES keys, so a shared batch schedule never applies
+        key = hex_to_bytes(key_hex)
+        (nr, round_keys), tweak_schedule = xts_schedules(key_hex)
+    elif schedule is None:
+        key = parse_key(key_hex)
+        _, nr, round_keys = KEY_CACHE.expand(key)
+    else:
+        key, nr, round_keys = schedule
+    if timer is not None:
+        timer.mark("key")
 
-    key = hex_to_bytes(key_hex)
-    if len(key) not in (16, 24, 32):
-        raise ValueError("Key must be 128, 192, or 256 bits (16/24/32 bytes hex)")
-
-    iv = hex_to_bytes(iv_hex) if iv_hex.strip() else default_iv()
+    if iv_hex.strip():
+        iv = hex_to_bytes(iv_hex)
+    else:
+        iv = default_nonce() if mode in AEAD_MODES else default_iv()
     counter = hex_to_bytes(counter_hex) if counter_hex.strip() else default_counter()
+    aad = hex_to_bytes(aad_hex) if aad_hex.strip() else b""
 
     if mode not in ("ECB", "CBC"):
         padding_flag = False
 
-    # auto-detect encoding :)
-    chosen_encoding = input_encoding
-    if operation == "decrypt" and input_encoding == "utf8":
-        detected = detect_encoding(text)
-        if detected:
-            chosen_encoding = detected
+    return {
+        "operation": operation,
+        "mode": mode,
+        "padding": padding_flag,
+        "key": key,
+        "nr": nr,
+        "round_keys": round_keys,
+        "iv": iv,
+        "counter": counter,
+        "engine": engine,
+        "trace": trace,
+        "offset": range_offset,
+        "length": range_length,
+        "counter_width": counter_width,
+        "aad": aad,
+        "tag_length": tag_length,
+        "tweak_schedule": tweak_schedule,
+        "sector": sector,
+        "sector_size": sector_size,
+    }
 
-    data_bytes = decode_input(text, chosen_encoding)
+
+# run the cipher on raw bytes; output stays raw so callers pick the wire encoding
+def cipher_bytes(params, data_bytes, traces=None, timer=None):
+    operation = params["operation"]
+    mode = params["mode"]
+    padding_flag = params["padding"]
+    key = params["key"]
+    nr = params["nr"]
+    round_keys = params["round_keys"]
+    iv = params["iv"]
+    counter = params["counter"]
+    engine = params["engine"]
+    trace = params["trace"]
+    range_offset = params["offset"]
+    range_length = params["length"]
+    counter_width = params["counter_width"]
+    aad = params["aad"]
+    tag_length = params["tag_length"]
+    tweak_schedule = params["tweak_schedule"]
+    sector = params["sector"]
+    sector_size = params["sector_size"]
+    # stored traces run a full trace straight into the trace store
+    traces = TRACE_STORE if traces is None else traces
+    sink = traces.recorder() if trace == "stored" else None
+    mode_trace = "full" if trace == "stored" else trace
 
     if mode in ("ECB", "CBC") and len(data_bytes) % BLOCK_SIZE != 0 and operation == "decrypt":
         # block modes need aligned length
         raise ValueError("Ciphertext length must be a multiple of 16 bytes for this mode.")
 
-    nk, nr, round_keys = expand_key(key)
-
     auto_padded = False
-    if operation == "encrypt":
+    byte_range = None
+    if range_offset is not None or range_length is not None:
+        # random access into a CTR stream: the data is the range itself and offset is its stream position,
+        # so clients send only the bytes they want back
+        if mode != "CTR":
+            raise ValueError("offset/length are only supported for CTR mode")
+        try:
+            range_offset = int(range_offset or 0)
+            range_length = len(data_bytes) if range_length is None else int(range_length)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("offset and length must be integers") from exc
+        if range_offset < 0 or range_length < 0:
+            raise ValueError("offset and length must be non-negative")
+        if range_length > len(data_bytes):
+            raise ValueError(f"length {range_length} is more than the {len(data_bytes)} bytes supplied")
+        run_range = encrypt_ctr_range if operation == "encrypt" else decrypt_ctr_range
+        output, steps = run_range(
+            key, memoryview(data_bytes)[:range_length], counter, range_offset, round_keys, nr, engine, mode_trace, sink,
+            counter_width,
+        )
+        byte_range = {"offset": range_offset, "length": len(output)}
+        iv_used = None
+        counter_used = bytes_to_hex(counter)
+    elif operation == "encrypt":
         pad_now = padding_flag
         if mode in ("ECB", "CBC"):
             if len(data_bytes) % BLOCK_SIZE != 0:
@@ -1075,89 +2660,956 @@ def run_cipher(payload):
             pad_now = True  # always pad block modes on encrypt
 
         if mode == "ECB":
-            output, steps = encrypt_ecb(key, data_bytes, pad_now, round_keys, nr)
+            output, steps = encrypt_ecb(key, data_bytes, pad_now, round_keys, nr, engine, mode_trace, sink)
             iv_used = None
             counter_used = None
         elif mode == "CBC":
-            output, steps = encrypt_cbc(key, data_bytes, iv, pad_now, round_keys, nr)
+            output, steps = encrypt_cbc(key, data_bytes, iv, pad_now, round_keys, nr, engine, mode_trace, sink)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "CFB":
-            output, steps = encrypt_cfb(key, data_bytes, iv, round_keys, nr)
+            output, steps = encrypt_cfb(key, data_bytes, iv, round_keys, nr, engine, mode_trace, sink)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "OFB":
-            output, steps = encrypt_ofb(key, data_bytes, iv, round_keys, nr)
+            output, steps = encrypt_ofb(key, data_bytes, iv, round_keys, nr, engine, mode_trace, sink, KEYSTREAM_CACHE)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "CTR":
-            output, steps = encrypt_ctr(key, data_bytes, counter, round_keys, nr)
+            output, steps = encrypt_ctr(
+                key, data_bytes, counter, round_keys, nr, engine, mode_trace, sink, counter_width, KEYSTREAM_CACHE
+            )
             iv_used = None
             counter_used = bytes_to_hex(counter)
+        elif mode == "GCM":
+            output, steps = encrypt_gcm(key, data_bytes, iv, aad, tag_length, round_keys, nr, engine, mode_trace, sink)
+            iv_used = bytes_to_hex(iv)
+            counter_used = None
+        elif mode == "CCM":
+            output, steps = encrypt_ccm(key, data_bytes, iv, aad, tag_length, round_keys, nr, engine, mode_trace, sink)
+            iv_used = bytes_to_hex(iv)
+            counter_used = None
+        elif mode == "XTS":
+            tweak_nr, tweak_round_keys = tweak_schedule
+            output, steps = encrypt_xts(
+                key, data_bytes, sector, sector_size, round_keys, nr, tweak_round_keys, tweak_nr, engine, mode_trace, sink
+            )
+            iv_used = None
+            counter_used = None
         else:
             raise ValueError("Unknown mode")
     else:
         pad_now = padding_flag
         if mode == "ECB":
-            output, steps = decrypt_ecb(key, data_bytes, pad_now, round_keys, nr)
+            output, steps = decrypt_ecb(key, data_bytes, pad_now, round_keys, nr, engine, mode_trace, sink)
             iv_used = None
             counter_used = None
         elif mode == "CBC":
-            output, steps = decrypt_cbc(key, data_bytes, iv, pad_now, round_keys, nr)
+            output, steps = decrypt_cbc(key, data_bytes, iv, pad_now, round_keys, nr, engine, mode_trace, sink)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "CFB":
-            output, steps = decrypt_cfb(key, data_bytes, iv, round_keys, nr)
+            output, steps = decrypt_cfb(key, data_bytes, iv, round_keys, nr, engine, mode_trace, sink)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "OFB":
-            output, steps = decrypt_ofb(key, data_bytes, iv, round_keys, nr)
+            output, steps = decrypt_ofb(key, data_bytes, iv, round_keys, nr, engine, mode_trace, sink, KEYSTREAM_CACHE)
             iv_used = bytes_to_hex(iv)
             counter_used = None
         elif mode == "CTR":
-            output, steps = decrypt_ctr(key, data_bytes, counter, round_keys, nr)
+            output, steps = decrypt_ctr(
+                key, data_bytes, counter, round_keys, nr, engine, mode_trace, sink, counter_width, KEYSTREAM_CACHE
+            )
             iv_used = None
             counter_used = bytes_to_hex(counter)
+        elif mode == "GCM":
+            output, steps = decrypt_gcm(key, data_bytes, iv, aad, tag_length, round_keys, nr, engine, mode_trace, sink)
+            iv_used = bytes_to_hex(iv)
+            counter_used = None
+        elif mode == "CCM":
+            output, steps = decrypt_ccm(key, data_bytes, iv, aad, tag_length, round_keys, nr, engine, mode_trace, sink)
+            iv_used = bytes_to_hex(iv)
+            counter_used = None
+        elif mode == "XTS":
+            tweak_nr, tweak_round_keys = tweak_schedule
+            output, steps = decrypt_xts(
+                key, data_bytes, sector, sector_size, round_keys, nr, tweak_round_keys, tweak_nr, engine, mode_trace, sink
+            )
+            iv_used = None
+            counter_used = None
         else:
             raise ValueError("Unknown mode")
 
+    # inline steps are built by the mode loop, so they count as "cipher"; stored ones are committed as "trace"
+    if timer is not None:
+        timer.mark("cipher")
+        timer.bytes += len(data_bytes)
+    trace_info = {"level": trace, "blocks": block_count(max(len(data_bytes), len(output)))}
+    if sink is not None:
+        trace_info["steps"] = len(sink)
+        trace_info["id"] = traces.commit(sink)
+        steps = []
+        if timer is not None:
+            timer.mark("trace")
+
     return {
-        "output": format_outputs(output),
-        "encodingUsed": chosen_encoding,
+        "output": output,
         "autoPadded": auto_padded,
         "ivUsed": iv_used,
         "counterUsed": counter_used,
         "steps": steps,
+        "trace": trace_info,
+        "range": byte_range,
     }
 
+
+# payload text as bytes, plus the encoding actually used
+def decode_payload_text(payload, operation):
+    text = payload.get("text", "")
+    input_encoding = payload.get("inputEncoding", "utf8")
+
+    # auto-detect encoding :)
+    if operation == "decrypt" and input_encoding == "utf8":
+        return detect_and_decode(text)
+
+    return decode_input(text, input_encoding), input_encoding
+
+
+# JSON request: text in the chosen encoding, output rendered as hex/base64/utf8
+def run_cipher(payload, schedule=None, traces=None, timer=None):
+    params = cipher_params(payload, schedule, timer)
+    encodings, utf8_limit = output_options(payload)
+    data_bytes, chosen_encoding = decode_payload_text(payload, params["operation"])
+    if timer is not None:
+        timer.mark("decode")
+    result = cipher_bytes(params, data_bytes, traces, timer)
+    result["output"] = format_outputs(result["output"], encodings, utf8_limit)
+    if timer is not None:
+        timer.mark("format")
+    result["encodingUsed"] = chosen_encoding
+    return result
+
+
+BINARY_MIMETYPE = "application/octet-stream"
+BINARY_PARAMS = (
+    "operation",
+    "mode",
+    "padding",
+    "keyHex",
+    "ivHex",
+    "counterHex",
+    "engine",
+    "trace",
+    "counterWidth",
+    "aadHex",
+    "tagLength",
+    "sector",
+    "sectorSize",
+    "offset",
+    "length",
+    "outputEncodings",
+    "utf8PreviewLimit",
+)
+BINARY_TRACE_LEVELS = ("none", "stored")
+
+
+# cipher parameters for a raw-body request: query string first, then X-Cipher-<name> headers
+def binary_payload(args, headers):
+    payload = {}
+    for name in BINARY_PARAMS:
+        value = args.get(name)
+        if value is None:
+            value = headers.get(f"X-Cipher-{name}")
+        if value is not None:
+            payload[name] = value
+    payload["padding"] = str(payload.get("padding", "false")).lower() in ("1", "true", "yes")
+    # steps cannot travel in a raw body; "stored" still works through the trace id header
+    payload.setdefault("trace", "none")
+    return payload
+
+
+# /api/cipher independent of the web framework: data is the raw body, or None for JSON requests;
+# binary_out results keep the output as raw bytes for binary_headers/the body
+# timer, if given, gets a mark at the end of each phase
+def handle_cipher(payload, data, binary_out, traces=None, timer=None):
+    if not binary_out:
+        if data is None:
+            return run_cipher(payload, traces=traces, timer=timer)
+        params = cipher_params(payload, timer=timer)
+        encodings, utf8_limit = output_options(payload)
+        result = cipher_bytes(params, data, traces, timer)
+        result["output"] = format_outputs(result["output"], encodings, utf8_limit)
+        if timer is not None:
+            timer.mark("format")
+        result["encodingUsed"] = "binary"
+        return result
+    if data is None:
+        payload = dict(payload)
+        payload.setdefault("trace", "none")
+    if payload["trace"] not in BINARY_TRACE_LEVELS:
+        raise ValueError(f"Binary responses support trace levels: {', '.join(BINARY_TRACE_LEVELS)}")
+    params = cipher_params(payload, timer=timer)
+    if data is None:
+        data, _ = decode_payload_text(payload, params["operation"])
+        if timer is not None:
+            timer.mark("decode")
+    return cipher_bytes(params, data, traces, timer)
+
+
+# response metadata for a raw output body
+def binary_headers(result):
+    headers = {"X-Cipher-Auto-Padded": "true" if result["autoPadded"] else "false"}
+    if result["ivUsed"]:
+        headers["X-Cipher-Iv-Used"] = result["ivUsed"]
+    if result["counterUsed"]:
+        headers["X-Cipher-Counter-Used"] = result["counterUsed"]
+    if result["trace"].get("id"):
+        headers["X-Cipher-Trace-Id"] = result["trace"]["id"]
+    if result["range"]:
+        headers["X-Cipher-Range-Offset"] = str(result["range"]["offset"])
+        headers["X-Cipher-Range-Length"] = str(result["range"]["length"])
+    return headers
+
 #Note: Chat-GPT helped with this section of the code
 #I just needed backend and frontend to communicate clearly
 
+BINARY_EXPOSE_HEADERS = ", ".join(
+    ("X-Cipher-Auto-Padded", "X-Cipher-Iv-Used", "X-Cipher-Counter-Used", "X-Cipher-Trace-Id", "X-Cipher-Range-Offset", "X-Cipher-Range-Length")
+)
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type, Accept, X-Cipher-Profile, " + ", ".join(f"X-Cipher-{name}" for name in BINARY_PARAMS),
+    "Access-Control-Expose-Headers": BINARY_EXPOSE_HEADERS + ", X-Cipher-Profile-Id, Server-Timing",
+    "Access-Control-Allow-Methods": "POST, OPTIONS",
+    # lets browser devtools and PerformanceServerTiming read Server-Timing cross-origin
+    "Timing-Allow-Origin": "*",
+}
+
+
 @app.after_request
 def add_cors_headers(resp):
-    resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
-    resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
+    resp.headers.update(CORS_HEADERS)
+    return resp
+
+
+# per-request phase durations on the monotonic clock; each mark closes the phase since the previous one
+class PhaseTimer:
+    __slots__ = ("phases", "bytes", "_start", "_last")
+
+    def __init__(self):
+        self.phases = []
+        self.bytes = 0
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    # fold in phases timed in another process; whatever else passed since the last mark becomes `rest`
+    def absorb(self, phases, rest):
+        now = time.perf_counter()
+        self.phases.extend(phases)
+        self.phases.append((rest, max(0.0, now - self._last - sum(seconds for _, seconds in phases))))
+        self._last = now
+
+    def total(self):
+        return self._last - self._start
+
+    def header(self):
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases]
+        parts.append(f"total;dur={self.total() * 1000:.3f}")
+        return ", ".join(parts)
+
+
+METRIC_ENDPOINTS = ("/api/cipher", "/api/cipher/batch", "/api/cipher/stream")
+METRIC_OPERATIONS = ("encrypt", "decrypt")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# (metric prefix, cache_stats() name, description) for the cache series in /api/metrics
+CACHE_METRICS = (
+    ("aes_key_schedule_cache", "keyCache", "Key schedule cache"),
+    ("aes_keystream_cache", "keystreamCache", "OFB/CTR keystream cache"),
+)
+# stats fields exported as counters (with _total) and gauges; fields a cache does not keep are skipped
+CACHE_COUNTERS = {
+    "hits": "lookups served from the cache",
+    "misses": "lookups that had to compute",
+    "extensions": "cached prefixes grown for a longer message",
+    "bypassed": "requests too large to cache",
+    "evictions": "entries dropped and their cached copy wiped (LRU, TTL or byte budget)",
+}
+CACHE_GAUGES = {
+    "entries": "entries held now",
+    "bytes": "bytes held now",
+}
+
+
+# stats of this process's caches, as reported by /api/health and /api/metrics
+def cache_stats():
+    return {"keyCache": KEY_CACHE.stats(), "keystreamCache": KEYSTREAM_CACHE.stats()}
+
+
+# label value from a fixed set, so client input cannot create new series
+def metric_label(value, allowed):
+    return value if value in allowed else "other"
+
+
+# aggregated /api/cipher latency, bytes and phase time plus error counts, rendered for Prometheus
+# recording is a bisect and a few dict updates under one lock
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (mode, operation) -> per-bucket counts (last one is +Inf), then the sum
+        self._latency = {}
+        self._bytes = {}
+        # phase -> [count, seconds]
+        self._phases = {}
+        # (endpoint, status) -> count
+        self._errors = {}
+
+    def observe(self, mode, operation, timer):
+        labels = (metric_label(mode, CIPHER_MODES), metric_label(operation, METRIC_OPERATIONS))
+        seconds = timer.total()
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self._latency.get(labels)
+            if counts is None:
+                counts = self._latency[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += seconds
+            self._bytes[labels] = self._bytes.get(labels, 0) + timer.bytes
+            for name, spent in timer.phases:
+                phase = self._phases.get(name)
+                if phase is None:
+                    phase = self._phases[name] = [0, 0.0]
+                phase[0] += 1
+                phase[1] += spent
+
+    def error(self, endpoint, status):
+        labels = (metric_label(endpoint, METRIC_ENDPOINTS), str(status))
+        with self._lock:
+            self._errors[labels] = self._errors.get(labels, 0) + 1
+
+    # Prometheus text exposition format 0.0.4; caches is cache_stats() output, this process's by default
+    def render(self, caches=None):
+        caches = cache_stats() if caches is None else caches
+        with self._lock:
+            latency = {labels: list(counts) for labels, counts in self._latency.items()}
+            sizes = dict(self._bytes)
+            phases = {name: list(value) for name, value in self._phases.items()}
+            errors = dict(self._errors)
+        bounds = [format_metric_value(bound) for bound in self.buckets] + ["+Inf"]
+        lines = [
+            "# HELP cipher_request_duration_seconds Time to serve /api/cipher requests, from body read to serialized response.",
+            "# TYPE cipher_request_duration_seconds histogram",
+        ]
+        for (mode, operation), counts in sorted(latency.items()):
+            labels = f'mode="{mode}",operation="{operation}"'
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'cipher_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"cipher_request_duration_seconds_sum{{{labels}}} {format_metric_value(counts[-1])}")
+            lines.append(f"cipher_request_duration_seconds_count{{{labels}}} {cumulative}")
+        lines += [
+            "# HELP cipher_bytes_processed_total Input bytes run through the cipher by /api/cipher.",
+            "# TYPE cipher_bytes_processed_total counter",
+        ]
+        for (mode, operation), size in sorted(sizes.items()):
+            lines.append(f'cipher_bytes_processed_total{{mode="{mode}",operation="{operation}"}} {size}')
+        lines += [
+            "# HELP cipher_phase_seconds_total Time spent in each /api/cipher request phase.",
+            "# TYPE cipher_phase_seconds_total counter",
+        ]
+        for name, (_, spent) in sorted(phases.items()):
+            lines.append(f'cipher_phase_seconds_total{{phase="{name}"}} {format_metric_value(spent)}')
+        lines += [
+            "# HELP cipher_phase_total Requests that went through each /api/cipher request phase.",
+            "# TYPE cipher_phase_total counter",
+        ]
+        for name, (count, _) in sorted(phases.items()):
+            lines.append(f'cipher_phase_total{{phase="{name}"}} {count}')
+        lines += [
+            "# HELP cipher_errors_total Error responses from the cipher endpoints.",
+            "# TYPE cipher_errors_total counter",
+        ]
+        for (endpoint, status), count in sorted(errors.items()):
+            lines.append(f'cipher_errors_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        for prefix, name, description in CACHE_METRICS:
+            stats = caches.get(name, {})
+            for field, text in CACHE_COUNTERS.items():
+                if field in stats:
+                    metric = f"{prefix}_{field}_total"
+                    lines += [f"# HELP {metric} {description}: {text}.", f"# TYPE {metric} counter", f"{metric} {stats[field]}"]
+            for field, text in CACHE_GAUGES.items():
+                if field in stats:
+                    metric = f"{prefix}_{field}"
+                    lines += [f"# HELP {metric} {description}: {text}.", f"# TYPE {metric} gauge", f"{metric} {stats[field]}"]
+        return "\n".join(lines) + "\n"
+
+
+def format_metric_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+METRICS = Metrics()
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@app.after_request
+def count_errors(resp):
+    if resp.status_code >= 400 and request.path in METRIC_ENDPOINTS:
+        METRICS.error(request.path, resp.status_code)
     return resp
 
 
+PROFILE_MODES = ("deterministic", "sampling")
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_STORE_LIMIT = 64
+# client addresses that may send X-Cipher-Profile, e.g. CIPHER_PROFILE_ALLOW=127.0.0.1,::1; unset disables profiling
+PROFILE_ALLOWLIST = frozenset(
+    addr.strip() for addr in os.environ.get("CIPHER_PROFILE_ALLOW", "").split(",") if addr.strip()
+)
+
+
+# profiler asked for by an X-Cipher-Profile header value, or None when the header is absent
+def profile_request(value, client):
+    if not value:
+        return None
+    profiler = value.strip().lower()
+    if profiler in ("0", "false", "no"):
+        return None
+    if profiler in ("1", "true", "yes"):
+        profiler = "deterministic"
+    if profiler not in PROFILE_MODES:
+        raise AdmissionError(400, f"Unknown profiler (expected one of: {', '.join(PROFILE_MODES)})")
+    if client not in PROFILE_ALLOWLIST:
+        raise AdmissionError(403, "Profiling is not enabled for this client")
+    return profiler
+
+
+# one collapsed-stack frame name; no spaces or semicolons, so the output feeds flamegraph.pl/speedscope as is
+def frame_label(code):
+    return f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+
+
+# deterministic profiler: self time of every call stack in the calling thread, via sys.setprofile
+class StackProfiler:
+    def __init__(self):
+        self.stacks = {}
+        # open calls as [stack, start, time spent in callees]
+        self._open = []
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call" or event == "c_call":
+            name = frame_label(frame.f_code) if event == "call" else f"{getattr(arg, '__qualname__', 'builtin')}@builtin"
+            stack = f"{self._open[-1][0]};{name}" if self._open else name
+            self._open.append([stack, now, 0.0])
+        elif self._open:
+            stack, start, inner = self._open.pop()
+            elapsed = now - start
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - inner
+            if self._open:
+                self._open[-1][2] += elapsed
+
+    def run(self, func, *args):
+        sys.setprofile(self._event)
+        try:
+            return func(*args)
+        finally:
+            sys.setprofile(None)
+            self._open = []
+
+
+# sampling profiler: a helper thread reads the caller's stack every interval; each sample weighs the time since the last
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+
+    def run(self, func, *args):
+        target = threading.get_ident()
+        root = sys._getframe()
+        done = threading.Event()
+
+        def sample():
+            last = time.perf_counter()
+            while not done.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                now = time.perf_counter()
+                names = []
+                while frame is not None and frame is not root:
+                    names.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                # a sample racing the end of func would show run() joining this thread
+                if names and not done.is_set():
+                    stack = ";".join(reversed(names))
+                    self.stacks[stack] = self.stacks.get(stack, 0.0) + now - last
+                last = now
+
+        sampler = threading.Thread(target=sample, name="cipher-profiler", daemon=True)
+        sampler.start()
+        try:
+            return func(*args)
+        finally:
+            done.set()
+            sampler.join()
+
+
+PROFILERS = {"deterministic": StackProfiler, "sampling": SamplingProfiler}
+
+
+# func(*args) under the named profiler, as (return value, stack -> seconds)
+def run_profiled(profiler, func, *args):
+    runner = PROFILERS[profiler]()
+    return runner.run(func, *args), runner.stacks
+
+
+# "stack microseconds" lines, the collapsed format flame graph tools read
+def collapsed_stacks(stacks):
+    lines = []
+    for stack, seconds in sorted(stacks.items()):
+        micros = round(seconds * 1e6)
+        if micros > 0:
+            lines.append(f"{stack} {micros}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# finished profiles as collapsed-stack text; only the newest PROFILE_STORE_LIMIT are kept
+class ProfileStore:
+    def __init__(self, limit=PROFILE_STORE_LIMIT):
+        self.limit = limit
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def commit(self, stacks):
+        profile_id = uuid.uuid4().hex
+        text = collapsed_stacks(stacks)
+        with self._lock:
+            self._profiles[profile_id] = text
+            while len(self._profiles) > self.limit:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def stats(self):
+        with self._lock:
+            return {"profiles": len(self._profiles), "limit": self.limit, "enabled": bool(PROFILE_ALLOWLIST)}
+
+
+PROFILE_STORE = ProfileStore()
+
+
+MAX_BODY_BYTES = 64 << 20
+SMALL_BODY_BYTES = 64 << 10
+# lane -> (concurrent requests, queued requests, seconds a request may wait in the queue)
+ADMISSION_LIMITS = {
+    "small": (max(2, os.cpu_count() or 1), 64, 5.0),
+    "large": (2, 4, 30.0),
+}
+ADMISSION_WAIT_SAMPLES = 1024
+
+
+# request refused before it runs; status is the HTTP status to answer with
+class AdmissionError(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {} if self.retry_after is None else {"Retry-After": str(self.retry_after)}
+
+
+# small bodies get their own lane so they never queue behind big ones; unknown lengths count as large
+def admission_lane(content_length):
+    return "small" if content_length is not None and content_length <= SMALL_BODY_BYTES else "large"
+
+
+def check_body_size(size):
+    if size is not None and size > MAX_BODY_BYTES:
+        raise AdmissionError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+
+
+# one lane's limits and stats; subclasses supply the blocking or async acquire
+class AdmissionLane:
+    def __init__(self, name, concurrency, max_queue, max_wait):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=ADMISSION_WAIT_SAMPLES)
+
+    def _check_room(self):
+        if self.active >= self.concurrency and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionError(429, f"Too many {self.name} requests queued, retry later", retry_after=1)
+
+    def _timeout(self):
+        self.timed_out += 1
+        return AdmissionError(503, f"Server busy: no {self.name} request slot within {self.max_wait:g}s", retry_after=int(self.max_wait))
+
+    def _admit(self, waited):
+        self.active += 1
+        self.admitted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self._waits.append(waited)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        pick = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 3) if waits else 0.0
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "concurrency": self.concurrency,
+            "maxQueue": self.max_queue,
+            "maxWaitSeconds": self.max_wait,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timedOut": self.timed_out,
+            "waitMsAvg": round(self.wait_total / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "waitMsP50": pick(0.5),
+            "waitMsP99": pick(0.99),
+            "waitMsMax": round(self.wait_max * 1000, 3),
+        }
+
+
+# lane for the threaded Flask server: waiting requests block their thread
+class ThreadAdmissionLane(AdmissionLane):
+    def __init__(self, name, concurrency, max_queue, max_wait):
+        super().__init__(name, concurrency, max_queue, max_wait)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            self._check_room()
+            self.queued += 1
+            try:
+                ready = self._cond.wait_for(lambda: self.active < self.concurrency, self.max_wait)
+            finally:
+                self.queued -= 1
+            if not ready:
+                raise self._timeout()
+            self._admit(time.monotonic() - start)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+ADMISSION = {name: ThreadAdmissionLane(name, *limits) for name, limits in ADMISSION_LIMITS.items()}
+
+
+# run a view under admission control: body size cap, then a slot in the lane for its size
+def admitted(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        check_body_size(request.content_length)
+        lane = ADMISSION[admission_lane(request.content_length)]
+        lane.acquire()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            lane.release()
+
+    return wrapper
+
+
+# request body, capped at MAX_BODY_BYTES even when no Content-Length was sent
+def read_request_body():
+    if request.content_length is not None:
+        return request.get_data(cache=False)
+    chunks = []
+    size = 0
+    for chunk in iter_chunks(request.stream):
+        size += len(chunk)
+        check_body_size(size)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@app.errorhandler(AdmissionError)
+def admission_refused(exc):
+    return str(exc), exc.status, exc.headers()
+
+
+BATCH_MAX_ITEMS = 1000
+BATCH_DEFAULT_TRACE = "none"
+# a shard smaller than this costs more in pickling and process hops than it gains from running alongside others
+BATCH_SHARD_MIN_ITEMS = 16
+BATCH_WORKERS = os.cpu_count() or 1
+
+
+# one batch item as the ok/error envelope returned by /api/cipher/batch
+def run_batch_item(item, schedule, traces=None):
+    try:
+        if not isinstance(item, dict):
+            raise ValueError("Each batch item must be a JSON object")
+        # batch callers want throughput, so items skip the step trace unless they ask for one
+        if "trace" not in item:
+            item = dict(item, trace=BATCH_DEFAULT_TRACE)
+        return {"ok": True, "result": run_cipher(item, schedule, traces)}
+    except Exception as exc:
+        return {"ok": False, "error": str(exc)}
+
+
+# batch item indexes grouped by key, in order of first appearance
+def batch_groups(items):
+    if not isinstance(items, list):
+        raise ValueError("Batch body must be a JSON array or an object with an items array")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch is limited to {BATCH_MAX_ITEMS} items")
+    groups = OrderedDict()
+    for index, item in enumerate(items):
+        # XTS items expand their own key pair, so they join the group without a shared schedule
+        key_hex = item.get("keyHex", "") if isinstance(item, dict) and item.get("mode") not in SECTOR_MODES else None
+        groups.setdefault(key_hex, []).append(index)
+    return groups
+
+
+# item indexes for up to `workers` parallel shards: the key groups laid end to end and cut into even slices,
+# so a key spans at most a couple of shards and is expanded once in each
+def batch_shards(items, workers):
+    order = [index for indexes in batch_groups(items).values() for index in indexes]
+    count = max(1, min(workers, len(order) // BATCH_SHARD_MIN_ITEMS))
+    size = math.ceil(len(order) / count) if order else 1
+    return [order[start : start + size] for start in range(0, len(order), size)] or [[]]
+
+
+# many cipher requests at once: each distinct key is expanded once and its items run in the calling thread
+# (the engines hold the GIL, so threads would not overlap them; parallel batches are cut into shards, each a
+# run_batch_shard job in its own process)
+def run_cipher_batch(items, traces=None):
+    groups = batch_groups(items)
+    results = [None] * len(items)
+    for key_hex, indexes in groups.items():
+        schedule = None
+        if key_hex is not None:
+            try:
+                key = parse_key(key_hex)
+                _, nr, round_keys = KEY_CACHE.expand(key)
+                schedule = (key, nr, round_keys)
+            except Exception as exc:
+                for index in indexes:
+                    results[index] = {"ok": False, "error": str(exc)}
+                continue
+        for index in indexes:
+            results[index] = run_batch_item(items[index], schedule, traces)
+    return results
+
+
+# worker-process job: one shard of a batch, with its stored traces handed back for the parent to commit
+def run_batch_shard(items):
+    traces = PendingTraces()
+    return run_cipher_batch(items, traces=traces), traces.pending
+
+
+# shard results back in request order, their placeholder trace ids swapped for real ones
+def merge_batch_shards(count, shards, outcomes):
+    results = [None] * count
+    for indexes, (shard_results, pending) in zip(shards, outcomes):
+        for index, result in zip(indexes, shard_results):
+            if result["ok"]:
+                commit_pending(result["result"], pending)
+            results[index] = result
+    return results
+
+
+BATCH_POOL = None
+BATCH_POOL_LOCK = threading.Lock()
+
+
+# process pool for batch shards, started on the first batch that needs it; spawn, because the server has
+# threads running by then. The workers keep their own key caches, which /api/health does not see
+def batch_pool():
+    global BATCH_POOL
+    with BATCH_POOL_LOCK:
+        if BATCH_POOL is None:
+            BATCH_POOL = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return BATCH_POOL
+
+
+# /api/cipher/batch response body
+def batch_summary(results):
+    failed = sum(1 for result in results if not result["ok"])
+    return {"results": results, "count": len(results), "failed": failed}
+
+
 @app.route("/api/cipher", methods=["POST"])
+@admitted
 def api_cipher():
-    # handle cipher requests
+    # handle cipher requests; raw bytes in with an octet-stream body, raw bytes out when accepted
+    profiler = profile_request(request.headers.get("X-Cipher-Profile"), request.remote_addr)
+    timer = PhaseTimer()
+    binary_out = request.accept_mimetypes.best_match(["application/json", BINARY_MIMETYPE]) == BINARY_MIMETYPE
+    body = read_request_body()
+    timer.mark("read")
+    if request.mimetype == BINARY_MIMETYPE:
+        payload = binary_payload(request.args, request.headers)
+        data = body
+    else:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return "Invalid JSON", 400
+        data = None
+    timer.mark("parse")
+    profile_id = None
     try:
-        payload = request.get_json(force=True)
-    except Exception:
+        if profiler is None:
+            result = handle_cipher(payload, data, binary_out, timer=timer)
+        else:
+            result, stacks = run_profiled(profiler, handle_cipher, payload, data, binary_out, None, timer)
+            profile_id = PROFILE_STORE.commit(stacks)
+    except Exception as exc:
+        return str(exc), 400
+    if binary_out:
+        response = Response(bytes(result["output"]), mimetype=BINARY_MIMETYPE, headers=binary_headers(result))
+    else:
+        response = jsonify(result)
+    timer.mark("serialize")
+    METRICS.observe(payload.get("mode"), payload.get("operation"), timer)
+    response.headers["Server-Timing"] = timer.header()
+    if profile_id is not None:
+        response.headers["X-Cipher-Profile-Id"] = profile_id
+    return response
+
+
+@app.route("/api/cipher/batch", methods=["POST"])
+@admitted
+def api_cipher_batch():
+    # a JSON array of cipher requests in, results in the same order out
+    try:
+        payload = json.loads(read_request_body())
+    except ValueError:
         return "Invalid JSON", 400
+    items = payload.get("items") if isinstance(payload, dict) else payload
     try:
-        result = run_cipher(payload)
-        return jsonify(result)
-    except Exception as exc:
+        shards = batch_shards(items, BATCH_WORKERS)
+    except ValueError as exc:
+        return str(exc), 400
+    if len(shards) == 1:
+        results = run_cipher_batch(items)
+    else:
+        futures = [batch_pool().submit(run_batch_shard, [items[index] for index in shard]) for shard in shards]
+        results = merge_batch_shards(len(items), shards, [future.result() for future in futures])
+    return jsonify(batch_summary(results))
+
+
+# a cipher error after the 200 went out (an unaligned end, a counter running out mid-body) can no longer
+# become a 400; raised out of the response iterator, it makes werkzeug close the connection without the
+# final chunk, so the client sees a truncated transfer instead of a clean end. Not a ConnectionError: werkzeug
+# takes those for a dropped client and does not close. The interactive debugger (debug=True) catches it and
+# ends the response normally instead
+class StreamAborted(RuntimeError):
+    pass
+
+
+# first chunk, then the rest of a stream's output; a cipher error is logged and counted, then the stream is aborted
+def guarded_stream(first, output, body, endpoint):
+    yield first
+    try:
+        yield from output
+    except ValueError as exc:
+        app.logger.warning("%s aborted: %s", endpoint, exc)
+        METRICS.error(endpoint, "aborted")
+        discard_body(body)
+        raise StreamAborted(str(exc)) from None
+
+
+@app.route("/api/cipher/stream", methods=["POST"])
+def api_cipher_stream():
+    # raw body in, raw body out; parameters come from the query string
+    try:
+        params = stream_params(request.args)
+        check_stream_length(params, request.content_length)
+        context = stream_context(**params)
+    except ValueError as exc:
         return str(exc), 400
+    # streams have no size cap, but always take a large-lane slot, held until the last chunk is out
+    lane = ADMISSION["large"]
+    lane.acquire()
+    output = stream_cipher(iter_chunks(request.stream), context)
+    # run up to the first output chunk before answering, so errors that come before any output still get a 400
+    try:
+        first = next(output, b"")
+    except ValueError as exc:
+        lane.release()
+        discard_body(request.stream)
+        return str(exc), 400
+    except BaseException:
+        lane.release()
+        raise
+    response = Response(stream_with_context(guarded_stream(first, output, request.stream, request.path)), mimetype="application/octet-stream")
+    response.call_on_close(lane.release)
+    return response
+
+
+@app.route("/api/profile/<profile_id>", methods=["GET"])
+def api_profile(profile_id):
+    # collapsed stacks of a profiled request, one "frame;frame;frame microseconds" line per stack
+    text = PROFILE_STORE.get(profile_id)
+    if text is None:
+        return "Unknown or expired profile id", 404
+    return Response(text, mimetype="text/plain")
+
+
+# one page of a stored trace for the request args, as (body, status)
+def trace_page_request(trace_id, args):
+    try:
+        offset = int(args.get("offset", 0))
+        limit = int(args.get("limit", TRACE_PAGE_LIMIT))
+    except ValueError:
+        return "offset and limit must be integers", 400
+    if offset < 0 or limit < 1:
+        return "offset must be >= 0 and limit >= 1", 400
+    page = TRACE_STORE.page(trace_id, offset, min(limit, TRACE_PAGE_LIMIT))
+    if page is None:
+        return "Unknown or expired trace id", 404
+    return page, 200
+
+
+@app.route("/api/trace/<trace_id>", methods=["GET"])
+def api_trace(trace_id):
+    # page through a stored trace
+    body, status = trace_page_request(trace_id, request.args)
+    return (jsonify(body) if status == 200 else body), status
+
+
+# cache and store stats for /api/health
+def health_status():
+    return {
+        "status": "ok",
+        **cache_stats(),
+        "traceStore": TRACE_STORE.stats(),
+        "profileStore": PROFILE_STORE.stats(),
+        "admission": {name: lane.stats() for name, lane in ADMISSION.items()},
+    }
 
 
 @app.route("/api/health", methods=["GET"])
 def api_health():
-    return jsonify({"status": "ok"})
+    return jsonify(health_status())
+
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 if __name__ == "__main__":
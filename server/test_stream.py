@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from server.server import BLOCK_SIZE, app
+
+# /api/cipher/stream against a real werkzeug server: a clean stream ends with the last chunk, one that fails
+# after the 200 went out is cut off (connection closed without the last chunk) rather than left hanging
+# usage (from the repo root):
+#   python -m server.test_stream
+# exit status is 1 when any check fails
+
+KEY_HEX = "00" * 16
+CLIENT_TIMEOUT = 5.0
+LAST_CHUNK = b"0\r\n\r\n"
+
+
+# send a chunked POST on a raw socket; returns (status, body bytes as sent, closed by the server, seconds)
+def post_chunked(port, path, chunks, timeout=CLIENT_TIMEOUT):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    start = time.monotonic()
+    try:
+        sock.sendall(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n".encode("latin-1"))
+        for chunk in chunks:
+            sock.sendall(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+        sock.sendall(LAST_CHUNK)
+        received = bytearray()
+        closed = False
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    closed = True
+                    break
+                received += data
+        except socket.timeout:
+            pass
+    finally:
+        sock.close()
+    head, _, body = bytes(received).partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1]) if head.startswith(b"HTTP/") else None
+    return status, body, closed, time.monotonic() - start
+
+
+# failure messages for one stream: expected status, then either a complete or a cut-off transfer
+def check_stream(port, name, query, chunks, complete, expected_status=200):
+    status, body, closed, elapsed = post_chunked(port, f"/api/cipher/stream?{query}&keyHex={KEY_HEX}", chunks)
+    failures = []
+    if status != expected_status:
+        failures.append(f"{name}: status {status}, expected {expected_status}")
+    if not closed:
+        failures.append(f"{name}: no end of transfer within {CLIENT_TIMEOUT:g}s")
+    elif body.endswith(LAST_CHUNK) != complete:
+        failures.append(f"{name}: {'missing' if complete else 'got'} the last chunk after {elapsed:.2f}s")
+    return failures
+
+
+# (name, query, body chunks, whether the transfer should end cleanly); the failing bodies put out a
+# first chunk before the error, so the 200 has been sent by then
+STREAM_CASES = (
+    ("clean CBC encrypt", "mode=CBC&operation=encrypt", [b"a" * 70000, b"b" * 5], True),
+    ("unaligned CBC decrypt", "mode=CBC&operation=decrypt", [b"a" * 70000, b"b" * 5], False),
+    (
+        "CTR counter running out",
+        f"mode=CTR&operation=encrypt&counterWidth=32&counterHex={'00' * 12}ffffe000",
+        [b"a" * 70000, b"b" * (8192 * BLOCK_SIZE)],
+        False,
+    ),
+)
+
+# (name, query, body chunks): errors found before any output, with body left unread; a 400 that ends cleanly
+ERROR_CASES = (
+    (
+        "CTR overflow in the first window",
+        f"mode=CTR&operation=encrypt&counterWidth=32&counterHex={'00' * 12}ffffff00",
+        [b"a" * 70000, b"b" * 70000],
+    ),
+)
+
+
+def run_checks(log=None):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    failures = []
+    try:
+        cases = [(name, query, chunks, complete, 200) for name, query, chunks, complete in STREAM_CASES]
+        cases += [(name, query, chunks, False, 400) for name, query, chunks in ERROR_CASES]
+        for name, query, chunks, complete, status in cases:
+            found = check_stream(server.server_port, name, query, chunks, complete, status)
+            failures += found
+            if log:
+                log(f"{'FAIL' if found else 'ok  '} {name}")
+    finally:
+        server.shutdown()
+        thread.join()
+    return failures
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m server.test_stream", description="streaming endpoint checks on a real server")
+    parser.add_argument("--quiet", action="store_true", help="only print failures, without the server log")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log = None if args.quiet else print
+    if args.quiet:
+        # the request log and the expected tracebacks of the aborted streams
+        logging.getLogger("werkzeug").setLevel(logging.CRITICAL)
+        app.logger.setLevel(logging.CRITICAL)
+    failures = run_checks(log)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        return 1
+    if log:
+        log(f"all {len(STREAM_CASES) + len(ERROR_CASES)} stream checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
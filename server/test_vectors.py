@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import argparse
+import sys
+
+from server.bench import parse_list
+from server.server import (
+    ENGINES,
+    KEY_CACHE,
+    XTS_SECTOR_SIZE,
+    decrypt_ccm,
+    decrypt_gcm,
+    decrypt_xts,
+    encrypt_ccm,
+    encrypt_gcm,
+    encrypt_xts,
+    np,
+)
+
+# known-answer checks against published test vectors, on every engine
+# usage (from the repo root):
+#   python -m server.test_vectors                     # all modes, all installed engines
+#   python -m server.test_vectors --modes GCM --engines ttable
+# exit status is 1 when any vector fails
+
+GCM_KEY = "feffe9928665731c6d6a8f9467308308"
+GCM_AAD = "feedfacedeadbeeffeedfacedeadbeefabaddad2"
+GCM_PLAINTEXT = (
+    "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72"
+    "1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b391aafd255"
+)
+GCM_IV_60 = (
+    "9313225df88406e555909c5aff5269aa6a7a9538534f7da1e4c303d2a318a728"
+    "c3c0c95156809539fcf0e2429a6b525416aedbf5a0de6a57a637b39b"
+)
+
+# (name, key, iv, aad, plaintext, ciphertext, tag): test cases 1-18 of the GCM specification
+# (McGrew and Viega), the known answers SP 800-38D implementations are checked against
+GCM_VECTORS = (
+    ("GCM 1", "00" * 16, "00" * 12, "", "", "", "58e2fccefa7e3061367f1d57a4e7455a"),
+    ("GCM 2", "00" * 16, "00" * 12, "", "00" * 16, "0388dace60b6a392f328c2b971b2fe78", "ab6e47d42cec13bdf53a67b21257bddf"),
+    (
+        "GCM 3", GCM_KEY, "cafebabefacedbaddecaf888", "", GCM_PLAINTEXT,
+        "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+        "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985",
+        "4d5c2af327cd64a62cf35abd2ba6fab4",
+    ),
+    (
+        "GCM 4", GCM_KEY, "cafebabefacedbaddecaf888", GCM_AAD, GCM_PLAINTEXT[:120],
+        "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+        "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091",
+        "5bc94fbc3221a5db94fae95ae7121a47",
+    ),
+    (
+        "GCM 5", GCM_KEY, "cafebabefacedbad", GCM_AAD, GCM_PLAINTEXT[:120],
+        "61353b4c2806934a777ff51fa22a4755699b2a714fcdc6f83766e5f97b6c7423"
+        "73806900e49f24b22b097544d4896b424989b5e1ebac0f07c23f4598",
+        "3612d2e79e3b0785561be14aaca2fccb",
+    ),
+    (
+        "GCM 6", GCM_KEY, GCM_IV_60, GCM_AAD, GCM_PLAINTEXT[:120],
+        "8ce24998625615b603a033aca13fb894be9112a5c3a211a8ba262a3cca7e2ca7"
+        "01e4a9a4fba43c90ccdcb281d48c7c6fd62875d2aca417034c34aee5",
+        "619cc5aefffe0bfa462af43c1699d050",
+    ),
+    ("GCM 7", "00" * 24, "00" * 12, "", "", "", "cd33b28ac773f74ba00ed1f312572435"),
+    ("GCM 8", "00" * 24, "00" * 12, "", "00" * 16, "98e7247c07f0fe411c267e4384b0f600", "2ff58d80033927ab8ef4d4587514f0fb"),
+    (
+        "GCM 9", GCM_KEY + GCM_KEY[:16], "cafebabefacedbaddecaf888", "", GCM_PLAINTEXT,
+        "3980ca0b3c00e841eb06fac4872a2757859e1ceaa6efd984628593b40ca1e19c"
+        "7d773d00c144c525ac619d18c84a3f4718e2448b2fe324d9ccda2710acade256",
+        "9924a7c8587336bfb118024db8674a14",
+    ),
+    (
+        "GCM 10", GCM_KEY + GCM_KEY[:16], "cafebabefacedbaddecaf888", GCM_AAD, GCM_PLAINTEXT[:120],
+        "3980ca0b3c00e841eb06fac4872a2757859e1ceaa6efd984628593b40ca1e19c"
+        "7d773d00c144c525ac619d18c84a3f4718e2448b2fe324d9ccda2710",
+        "2519498e80f1478f37ba55bd6d27618c",
+    ),
+    (
+        "GCM 11", GCM_KEY + GCM_KEY[:16], "cafebabefacedbad", GCM_AAD, GCM_PLAINTEXT[:120],
+        "0f10f599ae14a154ed24b36e25324db8c566632ef2bbb34f8347280fc4507057"
+        "fddc29df9a471f75c66541d4d4dad1c9e93a19a58e8b473fa0f062f7",
+        "65dcc57fcf623a24094fcca40d3533f8",
+    ),
+    (
+        "GCM 12", GCM_KEY + GCM_KEY[:16], GCM_IV_60, GCM_AAD, GCM_PLAINTEXT[:120],
+        "d27e88681ce3243c4830165a8fdcf9ff1de9a1d8e6b447ef6ef7b79828666e45"
+        "81e79012af34ddd9e2f037589b292db3e67c036745fa22e7e9b7373b",
+        "dcf566ff291c25bbb8568fc3d376a6d9",
+    ),
+    ("GCM 13", "00" * 32, "00" * 12, "", "", "", "530f8afbc74536b9a963b4f1c4cb738b"),
+    ("GCM 14", "00" * 32, "00" * 12, "", "00" * 16, "cea7403d4d606b6e074ec5d3baf39d18", "d0d1c8a799996bf0265b98b5d48ab919"),
+    (
+        "GCM 15", GCM_KEY * 2, "cafebabefacedbaddecaf888", "", GCM_PLAINTEXT,
+        "522dc1f099567d07f47f37a32a84427d643a8cdcbfe5c0c97598a2bd2555d1aa"
+        "8cb08e48590dbb3da7b08b1056828838c5f61e6393ba7a0abcc9f662898015ad",
+        "b094dac5d93471bdec1a502270e3cc6c",
+    ),
+    (
+        "GCM 16", GCM_KEY * 2, "cafebabefacedbaddecaf888", GCM_AAD, GCM_PLAINTEXT[:120],
+        "522dc1f099567d07f47f37a32a84427d643a8cdcbfe5c0c97598a2bd2555d1aa"
+        "8cb08e48590dbb3da7b08b1056828838c5f61e6393ba7a0abcc9f662",
+        "76fc6ece0f4e1768cddf8853bb2d551b",
+    ),
+    (
+        "GCM 17", GCM_KEY * 2, "cafebabefacedbad", GCM_AAD, GCM_PLAINTEXT[:120],
+        "c3762df1ca787d32ae47c13bf19844cbaf1ae14d0b976afac52ff7d79bba9de0"
+        "feb582d33934a4f0954cc2363bc73f7862ac430e64abe499f47c9b1f",
+        "3a337dbf46a792c45e454913fe2ea8f2",
+    ),
+    (
+        "GCM 18", GCM_KEY * 2, GCM_IV_60, GCM_AAD, GCM_PLAINTEXT[:120],
+        "5a8def2f0c9e53f1f75d7853659e2a20eeb2b22aafde6419a058ab4f6f746bf4"
+        "0fc0c3b780f244452da3ebf1c5d82cdea2418997200ef82e44ae7e3f",
+        "a44a8266ee1c8eb0c8b5d4cf5ae9f19a",
+    ),
+)
+
+CCM_KEY = "404142434445464748494a4b4c4d4e4f"
+CCM_RFC_KEY = "c0c1c2c3c4c5c6c7c8c9cacbcccdcecf"
+
+# (name, key, nonce, aad, plaintext, ciphertext || tag, tag length): SP 800-38C Appendix C examples 1-4
+# (example 4 has 2^16 bytes of AAD, the long AAD length encoding) and RFC 3610 packet vectors 1-3
+CCM_VECTORS = (
+    ("CCM 1", CCM_KEY, "10111213141516", "0001020304050607", "20212223", "7162015b4dac255d", 4),
+    (
+        "CCM 2", CCM_KEY, "1011121314151617", "000102030405060708090a0b0c0d0e0f", "202122232425262728292a2b2c2d2e2f",
+        "d2a1f0e051ea5f62081a7792073d593d1fc64fbfaccd", 6,
+    ),
+    (
+        "CCM 3", CCM_KEY, "101112131415161718191a1b", "000102030405060708090a0b0c0d0e0f10111213",
+        "202122232425262728292a2b2c2d2e2f3031323334353637",
+        "e3b201a9f5b71a7a9b1ceaeccd97e70b6176aad9a4428aa5484392fbc1b09951", 8,
+    ),
+    (
+        "CCM 4", CCM_KEY, "101112131415161718191a1b1c", bytes(range(256)).hex() * 256,
+        "202122232425262728292a2b2c2d2e2f303132333435363738393a3b3c3d3e3f",
+        "69915dad1e84c6376a68c2967e4dab615ae0fd1faec44cc484828529463ccf72b4ac6bec93e8598e7f0dadbcea5b", 14,
+    ),
+    (
+        "RFC 3610 #1", CCM_RFC_KEY, "00000003020100a0a1a2a3a4a5", "0001020304050607", bytes(range(8, 31)).hex(),
+        "588c979a61c663d2f066d0c2c0f989806d5f6b61dac38417e8d12cfdf926e0", 8,
+    ),
+    (
+        "RFC 3610 #2", CCM_RFC_KEY, "00000004030201a0a1a2a3a4a5", "0001020304050607", bytes(range(8, 32)).hex(),
+        "72c91a36e135f8cf291ca894085c87e3cc15c439c9e43a3ba091d56e10400916", 8,
+    ),
+    (
+        "RFC 3610 #3", CCM_RFC_KEY, "00000005040302a0a1a2a3a4a5", "0001020304050607", bytes(range(8, 33)).hex(),
+        "51b1e5f44a197d1da46b0f8e2d282ae871e838bb64da8596574adaa76fbd9fb0c5", 8,
+    ),
+)
+
+XTS_PLAINTEXT_512 = bytes(range(256)).hex() * 2
+XTS_KEY_15 = "fffefdfcfbfaf9f8f7f6f5f4f3f2f1f0" "bfbebdbcbbbab9b8b7b6b5b4b3b2b1b0"
+
+# (name, data key || tweak key, data unit sequence number, plaintext, ciphertext): IEEE 1619-2007 Annex B,
+# each vector is one data unit; vectors 15-18 end in a partial block and go through ciphertext stealing
+XTS_VECTORS = (
+    (
+        "XTS 1", "00" * 32, 0, "00" * 32,
+        "917cf69ebd68b2ec9b9fe9a3eadda692cd43d2f59598ed858c02c2652fbf922e",
+    ),
+    (
+        "XTS 2", "11" * 16 + "22" * 16, 0x3333333333, "44" * 32,
+        "c454185e6a16936e39334038acef838bfb186fff7480adc4289382ecd6d394f0",
+    ),
+    (
+        "XTS 3", "fffefdfcfbfaf9f8f7f6f5f4f3f2f1f0" + "22" * 16, 0x3333333333, "44" * 32,
+        "af85336b597afc1a900b2eb21ec949d292df4c047e0b21532186a5971a227a89",
+    ),
+    (
+        "XTS 4", "27182818284590452353602874713526" "31415926535897932384626433832795", 0, XTS_PLAINTEXT_512,
+        "27a7479befa1d476489f308cd4cfa6e2a96e4bbe3208ff25287dd3819616e89c"
+        "c78cf7f5e543445f8333d8fa7f56000005279fa5d8b5e4ad40e736ddb4d35412"
+        "328063fd2aab53e5ea1e0a9f332500a5df9487d07a5c92cc512c8866c7e860ce"
+        "93fdf166a24912b422976146ae20ce846bb7dc9ba94a767aaef20c0d61ad0265"
+        "5ea92dc4c4e41a8952c651d33174be51a10c421110e6d81588ede82103a252d8"
+        "a750e8768defffed9122810aaeb99f9172af82b604dc4b8e51bcb08235a6f434"
+        "1332e4ca60482a4ba1a03b3e65008fc5da76b70bf1690db4eae29c5f1badd03c"
+        "5ccf2a55d705ddcd86d449511ceb7ec30bf12b1fa35b913f9f747a8afd1b130e"
+        "94bff94effd01a91735ca1726acd0b197c4e5b03393697e126826fb6bbde8ecc"
+        "1e08298516e2c9ed03ff3c1b7860f6de76d4cecd94c8119855ef5297ca67e9f3"
+        "e7ff72b1e99785ca0a7e7720c5b36dc6d72cac9574c8cbbc2f801e23e56fd344"
+        "b07f22154beba0f08ce8891e643ed995c94d9a69c9f1b5f499027a78572aeebd"
+        "74d20cc39881c213ee770b1010e4bea718846977ae119f7a023ab58cca0ad752"
+        "afe656bb3c17256a9f6e9bf19fdd5a38fc82bbe872c5539edb609ef4f79c203e"
+        "bb140f2e583cb2ad15b4aa5b655016a8449277dbd477ef2c8d6c017db738b18d"
+        "eb4a427d1923ce3ff262735779a418f20a282df920147beabe421ee5319d0568",
+    ),
+    (
+        "XTS 10",
+        "2718281828459045235360287471352662497757247093699959574966967627"
+        "3141592653589793238462643383279502884197169399375105820974944592",
+        0xFF,
+        XTS_PLAINTEXT_512,
+        "1c3b3a102f770386e4836c99e370cf9bea00803f5e482357a4ae12d414a3e63b"
+        "5d31e276f8fe4a8d66b317f9ac683f44680a86ac35adfc3345befecb4bb188fd"
+        "5776926c49a3095eb108fd1098baec70aaa66999a72a82f27d848b21d4a741b0"
+        "c5cd4d5fff9dac89aeba122961d03a757123e9870f8acf1000020887891429ca"
+        "2a3e7a7d7df7b10355165c8b9a6d0a7de8b062c4500dc4cd120c0f7418dae3d0"
+        "b5781c34803fa75421c790dfe1de1834f280d7667b327f6c8cd7557e12ac3a0f"
+        "93ec05c52e0493ef31a12d3d9260f79a289d6a379bc70c50841473d1a8cc81ec"
+        "583e9645e07b8d9670655ba5bbcfecc6dc3966380ad8fecb17b6ba02469a020a"
+        "84e18e8f84252070c13e9f1f289be54fbc481457778f616015e1327a02b140f1"
+        "505eb309326d68378f8374595c849d84f4c333ec4423885143cb47bd71c5edae"
+        "9be69a2ffeceb1bec9de244fbe15992b11b77c040f12bd8f6a975a44a0f90c29"
+        "a9abc3d4d893927284c58754cce294529f8614dcd2aba991925fedc4ae74ffac"
+        "6e333b93eb4aff0479da9a410e4450e0dd7ae4c6e2910900575da401fc07059f"
+        "645e8b7e9bfdef33943054ff84011493c27b3429eaedb4ed5376441a77ed4385"
+        "1ad77f16f541dfd269d50d6a5f14fb0aab1cbb4c1550be97f7ab4066193c4caa"
+        "773dad38014bd2092fa755c824bb5e54c4f36ffda9fcea70b9c6e693e148c151",
+    ),
+    ("XTS 15", XTS_KEY_15, 0x123456789A, bytes(range(17)).hex(), "6c1625db4671522d3d7599601de7ca09ed"),
+    ("XTS 16", XTS_KEY_15, 0x123456789A, bytes(range(18)).hex(), "d069444b7a7e0cab09e24447d24deb1fedbf"),
+    ("XTS 17", XTS_KEY_15, 0x123456789A, bytes(range(19)).hex(), "e5df1351c0544ba1350b3363cd8ef4beedbf9d"),
+    ("XTS 18", XTS_KEY_15, 0x123456789A, bytes(range(20)).hex(), "9d84c813f719aa2c7be3f66171c7c5c2edbf9dac"),
+)
+
+
+# failure messages for an AEAD vector: encrypt, decrypt, and a flipped tag bit must be refused
+def check_aead(encrypt, decrypt, key_hex, nonce_hex, aad_hex, plaintext_hex, expected_hex, tag_length, engine):
+    key, nonce, aad = bytes.fromhex(key_hex), bytes.fromhex(nonce_hex), bytes.fromhex(aad_hex)
+    plaintext, expected = bytes.fromhex(plaintext_hex), bytes.fromhex(expected_hex)
+    _, nr, round_keys = KEY_CACHE.expand(key)
+    failures = []
+    output, _ = encrypt(key, plaintext, nonce, aad, tag_length, round_keys, nr, engine, "none")
+    if output != expected:
+        failures.append(f"encrypt gave {output.hex()}")
+    try:
+        output, _ = decrypt(key, expected, nonce, aad, tag_length, round_keys, nr, engine, "none")
+        if output != plaintext:
+            failures.append(f"decrypt gave {output.hex()}")
+    except ValueError as exc:
+        failures.append(f"decrypt failed: {exc}")
+    tampered = bytearray(expected)
+    tampered[-1] ^= 1
+    try:
+        decrypt(key, bytes(tampered), nonce, aad, tag_length, round_keys, nr, engine, "none")
+        failures.append("decrypt accepted a bad tag")
+    except ValueError:
+        pass
+    return failures
+
+
+def check_gcm(vector, engine):
+    _, key_hex, iv_hex, aad_hex, plaintext_hex, ciphertext_hex, tag_hex = vector
+    expected_hex = ciphertext_hex + tag_hex
+    return check_aead(encrypt_gcm, decrypt_gcm, key_hex, iv_hex, aad_hex, plaintext_hex, expected_hex, len(tag_hex) // 2, engine)
+
+
+def check_ccm(vector, engine):
+    return check_aead(encrypt_ccm, decrypt_ccm, *vector[1:], engine)
+
+
+# failure messages for one XTS vector: encrypt and decrypt as a single data unit; the key halves are
+# expanded directly because vector 1 uses equal data and tweak keys, which the API refuses
+def check_xts(vector, engine):
+    _, key_hex, sector, plaintext_hex, ciphertext_hex = vector
+    key, plaintext, expected = bytes.fromhex(key_hex), bytes.fromhex(plaintext_hex), bytes.fromhex(ciphertext_hex)
+    _, nr, round_keys = KEY_CACHE.expand(key[: len(key) // 2])
+    _, tweak_nr, tweak_round_keys = KEY_CACHE.expand(key[len(key) // 2 :])
+    args = (sector, XTS_SECTOR_SIZE, round_keys, nr, tweak_round_keys, tweak_nr, engine, "none")
+    failures = []
+    output, _ = encrypt_xts(None, plaintext, *args)
+    if output != expected:
+        failures.append(f"encrypt gave {output.hex()}")
+    output, _ = decrypt_xts(None, expected, *args)
+    if output != plaintext:
+        failures.append(f"decrypt gave {output.hex()}")
+    return failures
+
+
+# mode -> (vectors, check(vector, engine) -> failure messages)
+VECTOR_SUITES = {
+    "GCM": (GCM_VECTORS, check_gcm),
+    "CCM": (CCM_VECTORS, check_ccm),
+    "XTS": (XTS_VECTORS, check_xts),
+}
+
+
+# run the suites; returns (vectors checked, failures as "engine name: message" lines)
+def run_vectors(modes, engines, log=None):
+    checked = 0
+    failures = []
+    for engine in engines:
+        for mode in modes:
+            vectors, check = VECTOR_SUITES[mode]
+            for vector in vectors:
+                checked += 1
+                for message in check(vector, engine):
+                    failures.append(f"{engine} {vector[0]}: {message}")
+            if log:
+                log(f"{mode:<4} {engine:<9} {len(vectors)} vectors")
+    return checked, failures
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m server.test_vectors", description="AES mode known-answer tests")
+    parser.add_argument("--modes", default="all", help="comma-separated modes (default all)")
+    parser.add_argument("--engines", default="all", help="comma-separated engines (default all installed)")
+    parser.add_argument("--quiet", action="store_true", help="only print failures")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    installed = [engine for engine in ENGINES if engine != "numpy" or np is not None]
+    try:
+        modes = parse_list(args.modes, VECTOR_SUITES, "mode")
+        engines = parse_list(args.engines, installed, "engine")
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+    log = None if args.quiet else print
+    checked, failures = run_vectors(modes, engines, log)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        print(f"{len(failures)} failure(s) in {checked} vector checks", file=sys.stderr)
+        return 1
+    if log:
+        log(f"all {checked} vector checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())